@@ -8,6 +8,7 @@
 import time
 import hashlib
 import json
+from concurrent.futures import Future
 from threading import Lock
 
 
@@ -39,13 +40,14 @@ class TTLCache:
             self._hits += 1
             return value
 
-    def set(self, key: str, value) -> None:
+    def set(self, key: str, value, ttl: int | None = None) -> None:
+        """Store value; ttl overrides the cache default (e.g. short negative entries)."""
         with self._lock:
             if len(self._store) >= self._max_size:
                 # Evict the entry closest to expiry
                 oldest_key = min(self._store, key=lambda k: self._store[k][1])
                 del self._store[oldest_key]
-            self._store[key] = (value, time.monotonic() + self._ttl)
+            self._store[key] = (value, time.monotonic() + (self._ttl if ttl is None else ttl))
 
     def stats(self) -> dict:
         with self._lock:
@@ -64,6 +66,137 @@ class TTLCache:
             self._store.clear()
 
 
+class PrefixIndex:
+    """
+    Popularity-ranked autocomplete completions from recent traffic.
+
+    Every successful autocomplete records (region, normalized query) → results
+    with a hit count. Very short queries are answered from here — the most
+    popular recorded query in the same region starting with the prefix —
+    instead of going upstream, where 1–2 character results are mostly noise.
+
+    The best completion for every (region, prefix) up to max_prefix_len
+    characters is kept up to date on record(), so a lookup is a dict hit.
+    Entries sit in per-count buckets, so evicting the least popular entry
+    (oldest first among ties) is O(1) too. Thread-safe.
+    """
+
+    def __init__(self, max_entries: int = 4096, max_prefix_len: int = 2):
+        self._entries: dict = {}        # (region, q) → [count, results]
+        self._buckets: dict = {}        # count → {(region, q): None}, oldest first
+        self._min_count = 0
+        self._queries: dict = {}        # (region, prefix) → {q, ...}
+        self._best: dict = {}           # (region, prefix) → most popular q
+        self._max = max_entries
+        self._max_prefix = max_prefix_len
+        self._lock = Lock()
+
+    def _prefixes(self, q: str):
+        return (q[:i] for i in range(min(len(q), self._max_prefix) + 1))
+
+    def _count(self, region, q: str) -> int:
+        return self._entries[(region, q)][0]
+
+    def record(self, q: str, region, results: list) -> None:
+        q = " ".join(q.lower().split())
+        key = (region, q)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                bucket = self._buckets[entry[0]]
+                del bucket[key]
+                if not bucket:
+                    del self._buckets[entry[0]]
+                    if self._min_count == entry[0]:
+                        self._min_count += 1
+                entry[0] += 1
+                entry[1] = results
+            else:
+                if len(self._entries) >= self._max:
+                    self._evict()
+                entry = self._entries[key] = [1, results]
+                self._min_count = 1
+                for p in self._prefixes(q):
+                    self._queries.setdefault((region, p), {})[q] = None
+            self._buckets.setdefault(entry[0], {})[key] = None
+
+            for p in self._prefixes(q):
+                best = self._best.get((region, p))
+                if best is None or entry[0] > self._count(region, best):
+                    self._best[(region, p)] = q
+
+    def lookup(self, prefix: str, region, limit: int) -> list:
+        prefix = " ".join(prefix.lower().split())
+        with self._lock:
+            if len(prefix) <= self._max_prefix:
+                q = self._best.get((region, prefix))
+            else:   # longer than the index: scan only its indexed prefix's queries
+                q = max(
+                    (c for c in self._queries.get((region, prefix[:self._max_prefix]), ())
+                     if c.startswith(prefix)),
+                    key=lambda c: self._count(region, c), default=None,
+                )
+            return self._entries[(region, q)][1][:limit] if q is not None else []
+
+    def _evict(self) -> None:
+        bucket = self._buckets[self._min_count]
+        key = next(iter(bucket))
+        del bucket[key]
+        if not bucket:
+            del self._buckets[self._min_count]
+        del self._entries[key]
+
+        region, q = key
+        for p in self._prefixes(q):
+            pkey = (region, p)
+            queries = self._queries[pkey]
+            del queries[q]
+            if not queries:
+                del self._queries[pkey]
+                del self._best[pkey]
+            elif self._best[pkey] == q:
+                self._best[pkey] = max(queries, key=lambda c: self._count(region, c))
+
+
+class SingleFlight:
+    """
+    Collapses concurrent identical calls: while fn() for a key is in flight,
+    other callers with the same key wait for its result (or exception)
+    instead of issuing their own upstream request. Nothing is kept once the
+    call finishes — pair with a TTLCache for reuse after that.
+    Thread-safe.
+    """
+
+    def __init__(self):
+        self._calls: dict = {}          # key → Future of the in-flight call
+        self._lock = Lock()
+
+    def do(self, key: str, fn):
+        with self._lock:
+            fut = self._calls.get(key)
+            leader = fut is None
+            if leader:
+                fut = self._calls[key] = Future()
+        if not leader:
+            return fut.result()
+
+        try:
+            result = fn()
+        except BaseException as e:
+            fut.set_exception(e)
+            raise
+        else:
+            fut.set_result(result)
+            return result
+        finally:
+            with self._lock:
+                del self._calls[key]
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._calls)
+
+
 # ---------------------------------------------------------------------------
 # Module-level singletons
 # ---------------------------------------------------------------------------
@@ -72,9 +205,50 @@ class TTLCache:
 # (weather-dependent modes like best/loop are excluded — handled in routing.py)
 route_cache = TTLCache(ttl_seconds=1800, max_size=256)
 
+# Raw Valhalla /route response bytes for identical (locations, costing) requests,
+# shared by every routing mode; 2 min keeps bursts in one area off Valhalla
+valhalla_cache = TTLCache(ttl_seconds=120, max_size=1024)
+
 # Overpass results — POI data changes rarely, cache for 1 hour
 overpass_cache = TTLCache(ttl_seconds=3600, max_size=256)
 
+# Autocomplete suggestions — users retype the same prefixes, cache for 5 min
+autocomplete_cache = TTLCache(ttl_seconds=300, max_size=2048)
+
+# Reverse geocode addresses — effectively static, cache for 24 h
+reverse_geocode_cache = TTLCache(ttl_seconds=86400, max_size=2048)
+
+# Raw per-provider search results (Photon / Nominatim / Google), 5 min.
+# Empty results are stored with PROVIDER_NEGATIVE_TTL so a miss isn't re-asked
+# on every keystroke but a new POI shows up quickly.
+provider_cache = TTLCache(ttl_seconds=300, max_size=4096)
+PROVIDER_NEGATIVE_TTL = 60
+
+# IP → (lat, lon) for location bias; IP geolocation rarely moves, cache for 1 h
+ip_bias_cache = TTLCache(ttl_seconds=3600, max_size=4096)
+
+# In-flight upstream lookups (provider searches, places, IP bias), keyed like
+# their caches — covers the gap before the first result lands in the cache
+inflight = SingleFlight()
+
+# Short-query autocomplete completions, learned from recent traffic
+AUTOCOMPLETE_MIN_UPSTREAM_LEN = 3   # shorter queries never go upstream
+autocomplete_prefix_index = PrefixIndex(
+    max_entries=4096, max_prefix_len=AUTOCOMPLETE_MIN_UPSTREAM_LEN - 1,
+)
+
+# Current weather per ~1 km cell. Entries outlive their 15-min freshness
+# window (WEATHER_FRESH_SECONDS) so a stale value can stand in if Open-Meteo fails
+weather_cache = TTLCache(ttl_seconds=21600, max_size=1024)
+WEATHER_FRESH_SECONDS = 900
+
+# Sunrise/sunset per ~1 km cell — valid for the whole day, kept for two so
+# yesterday's times can be shifted forward if the API is down
+sun_cache = TTLCache(ttl_seconds=172800, max_size=1024)
+
+# /vision analyses — consecutive AR frames are near-identical, cache for 30 s
+vision_cache = TTLCache(ttl_seconds=30, max_size=512)
+
 
 # ---------------------------------------------------------------------------
 # Cache key helpers
@@ -90,6 +264,19 @@ def route_key(start: tuple, end: tuple | None, mode: str) -> str:
     return f"route:{lat1},{lon1}:{lat2},{lon2}:{mode}"
 
 
+def valhalla_key(
+    locations: list, costing: str,
+    costing_options: dict | None, extra_params: dict | None,
+) -> str:
+    """Cache key for one Valhalla /route request; locations rounded to ~11 m."""
+    stable = json.dumps(
+        [[(round(lat, 4), round(lon, 4)) for lat, lon in locations],
+         costing, costing_options, extra_params],
+        sort_keys=True, separators=(",", ":"),
+    )
+    return "valhalla:" + hashlib.md5(stable.encode()).hexdigest()
+
+
 def overpass_key(bbox: dict) -> str:
     """Stable cache key from a bounding box dict."""
     stable = json.dumps(
@@ -97,3 +284,61 @@ def overpass_key(bbox: dict) -> str:
         sort_keys=True,
     )
     return "overpass:" + hashlib.md5(stable.encode()).hexdigest()
+
+
+def autocomplete_key(q: str, user_lat: float | None, user_lon: float | None, limit: int) -> str:
+    """Cache key for autocomplete; location bias rounded to ~1 km."""
+    lat = round(user_lat, 2) if user_lat is not None else None
+    lon = round(user_lon, 2) if user_lon is not None else None
+    return f"ac:{q.lower()}:{lat},{lon}:{limit}"
+
+
+def reverse_geocode_key(lat: float, lon: float) -> str:
+    """Cache key for reverse geocoding (~1 m precision)."""
+    return f"rgc:{round(lat, 5)},{round(lon, 5)}"
+
+
+def provider_key(provider: str, q: str, lat: float | None, lon: float | None, limit: int) -> str:
+    """Cache key for one provider's results; normalized query, ~1 km location bucket."""
+    lat = round(lat, 2) if lat is not None else None
+    lon = round(lon, 2) if lon is not None else None
+    return f"{provider}:{' '.join(q.lower().split())}:{lat},{lon}:{limit}"
+
+
+def vision_key(detections: list, heading: float | None, distance_to_next: float | None) -> str:
+    """
+    Cache key for a /vision request: detections as a sorted (label, conf) multiset,
+    heading bucketed to 15°, distance to next turn bucketed to 5 m.
+    """
+    items = []
+    for d in detections:
+        if isinstance(d, dict):
+            label = d.get("label") or d.get("class") or d.get("name")
+            conf = d.get("conf", d.get("confidence"))
+            conf = round(float(conf), 1) if isinstance(conf, (int, float)) else None
+            items.append([str(label), conf])
+        else:
+            items.append([str(d), None])
+    items.sort(key=lambda x: (x[0], x[1] if x[1] is not None else -1.0))
+
+    h = int(round(heading / 15)) * 15 % 360 if heading is not None else None
+    dist = int(round(distance_to_next / 5)) * 5 if distance_to_next is not None else None
+    stable = json.dumps([items, h, dist], separators=(",", ":"))
+    return "vision:" + hashlib.md5(stable.encode()).hexdigest()
+
+
+def weather_key(lat: float, lon: float) -> str:
+    """Cache key for current weather (~1 km cell)."""
+    return f"wx:{round(lat, 2)},{round(lon, 2)}"
+
+
+def sun_key(lat: float, lon: float) -> str:
+    """Cache key for sunrise/sunset times (~1 km cell)."""
+    return f"sun:{round(lat, 2)},{round(lon, 2)}"
+
+
+def region_key(lat: float | None, lon: float | None) -> tuple | None:
+    """Coarse (~100 km) region bucket for sharing popular completions."""
+    if lat is None or lon is None:
+        return None
+    return round(lat), round(lon)
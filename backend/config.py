@@ -37,3 +37,18 @@ ENRICHMENT_MAX_FOOD: int = int(os.getenv("ENRICHMENT_MAX_FOOD", "8"))
 # Walking speed assumption (km/h) — used for duration → distance conversion
 # ---------------------------------------------------------------------------
 WALK_SPEED_KPH: float = float(os.getenv("WALK_SPEED_KPH", "5.0"))
+
+# ---------------------------------------------------------------------------
+# Elevation cache
+# ---------------------------------------------------------------------------
+# SQLite file backing the elevation cache across workers and restarts.
+# Empty disables the persistent tier (in-process cache only).
+ELEVATION_CACHE_PATH: str = os.getenv("ELEVATION_CACHE_PATH", "")
+ELEVATION_CACHE_TTL_DAYS: int = int(os.getenv("ELEVATION_CACHE_TTL_DAYS", "30"))
+
+# ---------------------------------------------------------------------------
+# OpenTopoData
+# ---------------------------------------------------------------------------
+# Seconds between the chunk POSTs of a long route. The public instance
+# allows 1 request/second; set 0 for a self-hosted instance.
+OPENTOPO_CHUNK_INTERVAL_S: float = float(os.getenv("OPENTOPO_CHUNK_INTERVAL_S", "1.0"))
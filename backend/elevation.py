@@ -1,40 +1,259 @@
-import requests
 import numpy as np
+import orjson
 import time
 import hashlib
+import logging
+import sqlite3
+from threading import Lock
+from concurrent.futures import ThreadPoolExecutor
+
+from backend.cache import TTLCache
+from backend.config import ELEVATION_CACHE_PATH, ELEVATION_CACHE_TTL_DAYS, OPENTOPO_CHUNK_INTERVAL_S
+from backend.utils.http import session as http
+
+logger = logging.getLogger(__name__)
 
 # ============================================================
 # GLOBAL IN-MEMORY CACHE (persists during process lifetime)
 # ============================================================
-ELEV_CACHE = {}   # key: "lat,lon" → elevation (meters)
+class _ElevationStore:
+    """
+    Packed-key elevation store: sorted int64 keys + parallel float64 values.
+
+    Route lookups are one np.searchsorted call instead of N dict probes, and
+    entries cost 16 bytes instead of ~100. New entries land in a small dict
+    and are merge-sorted into the arrays once MERGE_AT of them accumulate.
+    A key's elevation never changes, so first write wins. Values stay float64
+    so a key reads back identically from the pending dict, the merged arrays
+    and the SQLite tier.
+    """
+
+    MERGE_AT = 4096
+
+    def __init__(self):
+        self._lock = Lock()
+        self._reset()
+
+    def _reset(self):
+        self._keys = np.empty(0, dtype=np.int64)
+        self._vals = np.empty(0, dtype=np.float64)
+        self._pending: dict = {}
+
+    def __len__(self):
+        with self._lock:
+            return self._keys.size + len(self._pending)
+
+    def get_many(self, keys):
+        """Returns (values, hit_mask) for an int64 key array; misses are NaN."""
+        keys = np.asarray(keys, dtype=np.int64)
+        vals = np.full(keys.size, np.nan)
+        with self._lock:
+            if self._keys.size:
+                idx = np.searchsorted(self._keys, keys)
+                np.minimum(idx, self._keys.size - 1, out=idx)
+                hit = self._keys[idx] == keys
+                vals[hit] = self._vals[idx[hit]]
+            else:
+                hit = np.zeros(keys.size, dtype=bool)
+
+            if self._pending:
+                for i in np.flatnonzero(~hit):
+                    z = self._pending.get(int(keys[i]))
+                    if z is not None:
+                        vals[i] = z
+                        hit[i] = True
+        return vals, hit
+
+    def put_many(self, keys, vals):
+        _, hit = self.get_many(keys)
+        with self._lock:
+            for k, z in zip(np.asarray(keys)[~hit].tolist(),
+                            np.asarray(vals, dtype=float)[~hit].tolist()):
+                self._pending.setdefault(k, z)
+            if len(self._pending) >= self.MERGE_AT:
+                self._merge()
+
+    def _merge(self):
+        n = len(self._pending)
+        keys = np.concatenate([self._keys, np.fromiter(self._pending.keys(), np.int64, n)])
+        vals = np.concatenate([self._vals, np.fromiter(self._pending.values(), np.float64, n)])
+        order = np.argsort(keys, kind="stable")
+        self._keys, self._vals = keys[order], vals[order]
+        self._pending = {}
+
+    def clear(self):
+        with self._lock:
+            self._reset()
+
+
+ELEV_CACHE = _ElevationStore()   # key: packed (lat, lon) int64 → elevation (meters)
 
 
 def cache_key(lat, lon):
-    return f"{round(lat, 5)},{round(lon, 5)}"  # avoid micro-differences
+    """
+    Pack (lat, lon) at 1e-5° (~1 m) resolution into one signed 64-bit int:
+    high 32 bits = lat·1e5, low 32 bits = lon·1e5 (two's complement).
+    Cheaper to build and hash than a formatted string, and fits SQLite's
+    INTEGER primary key.
+    """
+    return (int(round(lat * 1e5)) << 32) | (int(round(lon * 1e5)) & 0xFFFFFFFF)
+
+
+def cache_keys(coords):
+    """Vectorized cache_key over an (N, 2) array of (lat, lon)."""
+    arr = np.asarray(coords, dtype=float).reshape(-1, 2)
+    q = np.rint(arr * 1e5).astype(np.int64)   # rint == round(): half-to-even
+    return (q[:, 0] << 32) | (q[:, 1] & 0xFFFFFFFF)
+
+
+# Point sets that every provider failed on — skip upstream for a minute
+# instead of pinning zeros into the cache forever.
+_neg_cache = TTLCache(ttl_seconds=60, max_size=256)
+
+
+def _neg_key(keys):
+    return hashlib.blake2b(np.ascontiguousarray(keys).tobytes(), digest_size=16).hexdigest()
+
+
+# ============================================================
+# PERSISTENT TIER (SQLite, shared by all workers on the host)
+# ============================================================
+# Hot tier is ELEV_CACHE above; this cold tier survives restarts and is
+# shared across uvicorn workers. Disabled when ELEVATION_CACHE_PATH is empty.
+_db = None
+_db_lock = Lock()
+_DB_TTL_S = ELEVATION_CACHE_TTL_DAYS * 86400
+_SQLITE_MAX_VARS = 900   # stay under SQLITE_MAX_VARIABLE_NUMBER on old builds
+
+
+def _get_db():
+    global _db
+    if _db is None and ELEVATION_CACHE_PATH:
+        try:
+            conn = sqlite3.connect(ELEVATION_CACHE_PATH, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS elevation "
+                "(key INTEGER PRIMARY KEY, z REAL NOT NULL, ts REAL NOT NULL)"
+            )
+            _db = conn
+        except sqlite3.Error as e:
+            logger.warning("elevation cache db disabled (%s): %s", ELEVATION_CACHE_PATH, e)
+    return _db
+
+
+def _cache_get_many(keys):
+    """
+    Look up an int64 key array in the hot tier, then the persistent tier.
+    Returns (values, hit_mask); misses are NaN.
+    """
+    vals, hit = ELEV_CACHE.get_many(keys)
+    if hit.all():
+        return vals, hit
+
+    missing = np.unique(keys[~hit]).tolist()
+    found = {}
+    with _db_lock:
+        db = _get_db()
+        if db is not None:
+            cutoff = time.time() - _DB_TTL_S
+            try:
+                for i in range(0, len(missing), _SQLITE_MAX_VARS):
+                    part = missing[i:i + _SQLITE_MAX_VARS]
+                    rows = db.execute(
+                        f"SELECT key, z FROM elevation WHERE ts > ? "
+                        f"AND key IN ({','.join('?' * len(part))})",
+                        (cutoff, *part),
+                    ).fetchall()
+                    found.update(rows)
+            except sqlite3.Error:
+                logger.exception("elevation cache read failed")
+
+    if found:
+        fk = np.fromiter(found.keys(), np.int64, len(found))
+        fv = np.fromiter(found.values(), float, len(found))
+        ELEV_CACHE.put_many(fk, fv)   # promote to hot tier
+        for i in np.flatnonzero(~hit):
+            z = found.get(int(keys[i]))
+            if z is not None:
+                vals[i] = z
+                hit[i] = True
+    return vals, hit
+
+
+def _cache_put_many(keys, vals, persist=True):
+    """Write key/value arrays to the hot tier and, if persist, the persistent tier."""
+    ELEV_CACHE.put_many(keys, vals)
+    if not persist or not len(keys):
+        return
+
+    with _db_lock:
+        db = _get_db()
+        if db is None:
+            return
+        now = time.time()
+        try:
+            with db:
+                db.executemany(
+                    "INSERT OR REPLACE INTO elevation (key, z, ts) VALUES (?, ?, ?)",
+                    [(k, z, now) for k, z in zip(np.asarray(keys).tolist(),
+                                                 np.asarray(vals, dtype=float).tolist())],
+                )
+        except sqlite3.Error:
+            logger.exception("elevation cache write failed")
 
 
 # ============================================================
 # 1. OpenTopoData (PRIMARY: free, global, stable)
 # ============================================================
+OPENTOPO_URL = "https://api.opentopodata.org/v1/eudem25m"
+OPENTOPO_MAX_LOCATIONS = 100   # per-request cap on the public instance
+
+
 def fetch_opentopo(coords):
     """
     coords = [(lat, lon), ...]
-    Returns list of elevations or None (if fails)
+    Returns ndarray of elevations or None (if fails)
+
+    Routes longer than OPENTOPO_MAX_LOCATIONS are split into chunks up
+    front, so they never pay a rejected full-size POST.
     """
+    if len(coords) > OPENTOPO_MAX_LOCATIONS:
+        return _fetch_opentopo_chunked(coords)
+
     locations = "|".join([f"{lat},{lon}" for lat, lon in coords])
-    url = f"https://api.opentopodata.org/v1/eudem25m?locations={locations}"
 
     try:
-        r = requests.get(url, timeout=4)
+        r = http.post(OPENTOPO_URL, json={"locations": locations}, timeout=8)
         if r.status_code != 200:
             return None
-        js = r.json()
-        return [pt["elevation"] if pt["elevation"] is not None else 0
-                for pt in js.get("results", [])]
-    except:
+        results = orjson.loads(r.content).get("results", [])
+        if len(results) != len(coords):
+            return None
+        # null (outside the dataset) → NaN, so it is never cached as 0 m
+        return np.fromiter((np.nan if pt["elevation"] is None else pt["elevation"]
+                            for pt in results), dtype=float, count=len(results))
+    except Exception:
         return None
 
 
+def _fetch_opentopo_chunked(coords):
+    """
+    Fetch OPENTOPO_MAX_LOCATIONS-sized chunks one after another, spaced
+    OPENTOPO_CHUNK_INTERVAL_S apart to stay inside the public rate limit.
+    Stops at the first failed chunk.
+    """
+    results = []
+    for i in range(0, len(coords), OPENTOPO_MAX_LOCATIONS):
+        if i:
+            time.sleep(OPENTOPO_CHUNK_INTERVAL_S)
+        res = fetch_opentopo(coords[i:i + OPENTOPO_MAX_LOCATIONS])
+        if res is None:
+            return None
+        results.append(res)
+    return np.concatenate(results)
+
+
 # ============================================================
 # 2. ESRI Elevation API (fallback) — works globally
 # ============================================================
@@ -56,7 +275,7 @@ def fetch_esri(coords):
             "f": "json"
         }
 
-        r = requests.post(url, json=payload, timeout=5)
+        r = http.post(url, json=payload, timeout=5)
         if r.status_code != 200:
             return None
 
@@ -69,7 +288,7 @@ def fetch_esri(coords):
 
         return out if out else None
 
-    except:
+    except Exception:
         return None
 
 
@@ -79,16 +298,21 @@ def fetch_esri(coords):
 def fetch_usgs(coords):
     """
     USA high-quality elevation (USGS)
+    One request per point, issued concurrently.
     """
-    out = []
+    if not coords:
+        return []
+
+    def _one(coord):
+        lat, lon = coord
+        url = f"https://nationalmap.gov/epqs/pqs.php?x={lon}&y={lat}&units=Meters&output=json"
+        r = http.get(url, timeout=4).json()
+        return r["USGS_Elevation_Point_Query_Service"]["Elevation_Query"]["Elevation"]
+
     try:
-        for lat, lon in coords:
-            url = f"https://nationalmap.gov/epqs/pqs.php?x={lon}&y={lat}&units=Meters&output=json"
-            r = requests.get(url, timeout=4).json()
-            z = r["USGS_Elevation_Point_Query_Service"]["Elevation_Query"]["Elevation"]
-            out.append(z)
-        return out
-    except:
+        with ThreadPoolExecutor(max_workers=min(16, len(coords))) as ex:
+            return list(ex.map(_one, coords))
+    except Exception:
         return None
 
 
@@ -103,122 +327,141 @@ def fetch_batch(coords):
     3) ESRI
     4) USGS
     5) zeros
+
+    Only unique cache misses go upstream; results are spliced back in
+    input order. Returns an ndarray of elevations (meters).
     """
-    coords = list(coords)
-
-    # ————— STEP 1: return cached if all found —————
-    all_cached = True
-    elevations = []
-    for lat, lon in coords:
-        key = cache_key(lat, lon)
-        if key in ELEV_CACHE:
-            elevations.append(ELEV_CACHE[key])
-        else:
-            all_cached = False
-            break
-
-    if all_cached:
-        return elevations
-
-    # ————— STEP 2: OpenTopoData —————
-    res = fetch_opentopo(coords)
-    if res:
-        for (lat, lon), z in zip(coords, res):
-            ELEV_CACHE[cache_key(lat, lon)] = z
-        return res
-
-    # ————— STEP 3: ESRI —————
-    res = fetch_esri(coords)
-    if res:
-        for (lat, lon), z in zip(coords, res):
-            ELEV_CACHE[cache_key(lat, lon)] = z
-        return res
-
-    # ————— STEP 4: USGS (USA only) —————
-    res = fetch_usgs(coords)
-    if res:
-        for (lat, lon), z in zip(coords, res):
-            ELEV_CACHE[cache_key(lat, lon)] = z
-        return res
-
-    # ————— FINAL FALLBACK: zeros —————
-    zeros = [0] * len(coords)
-    for (lat, lon) in coords:
-        ELEV_CACHE[cache_key(lat, lon)] = 0
-    return zeros
+    arr = np.asarray(coords, dtype=float).reshape(-1, 2)
+    keys = cache_keys(arr)
+
+    # ————— STEP 1: cache hits —————
+    elev, hit = _cache_get_many(keys)
+    if hit.all():
+        return elev
+
+    # Unique misses only — dense GPX often repeats a key many times
+    miss = np.flatnonzero(~hit)
+    miss_keys, first, inverse = np.unique(keys[miss], return_index=True, return_inverse=True)
+    miss_coords = [tuple(c) for c in arr[miss[first]].tolist()]
+
+    # ————— STEP 2–4: OpenTopoData → ESRI → USGS (USA only) —————
+    nkey = _neg_key(miss_keys)
+    fetched = None
+    if _neg_cache.get(nkey) is None:
+        for fetch in (fetch_opentopo, fetch_esri, fetch_usgs):
+            res = fetch(miss_coords)
+            if res is not None and len(res) == len(miss_coords):
+                res = np.asarray(res, dtype=float)   # None → NaN
+                if np.isfinite(res).any():           # all-null: try next provider
+                    fetched = res
+                    break
+
+    # ————— FINAL FALLBACK: zeros (returned, never cached) —————
+    if fetched is None:
+        _neg_cache.set(nkey, True)
+        fetched = np.zeros(len(miss_keys))
+    else:
+        ok = np.isfinite(fetched)   # cache only points the provider resolved
+        _cache_put_many(miss_keys[ok], fetched[ok])
+        fetched[~ok] = 0.0
+
+    elev[miss] = fetched[inverse]
+    return elev
 
 
 # ============================================================
-# 5. Get full elevation profile (batching)
+# 5. Get full elevation profile (one batch per route)
 # ============================================================
 def get_elevation_profile(coords):
-    batch_size = 100
-    elev = []
-
-    for i in range(0, len(coords), batch_size):
-        chunk = coords[i:i+batch_size]
-        out = fetch_batch(chunk)
-        elev.extend(out)
-
+    elev = fetch_batch(coords)
     return smooth_elevation(elev)
 
 
 # ============================================================
 # 6. Smooth elevation profile
 # ============================================================
+_SMOOTH_KERNEL = np.array([1, 2, 4, 2, 1], dtype=float) / 10
+
+
 def smooth_elevation(elev):
-    elev = np.array(elev, dtype=float)
-    kernel = np.array([1, 2, 4, 2, 1]) / 10
-    return np.convolve(elev, kernel, mode="same").tolist()
+    elev = np.asarray(elev, dtype=float)   # no copy for float ndarrays
+    if elev.size == 0:
+        return elev
+    # Centered slice of the full convolution: same as mode="same" but keeps
+    # len(elev) even for profiles shorter than the kernel.
+    half = len(_SMOOTH_KERNEL) // 2
+    return np.convolve(elev, _SMOOTH_KERNEL, mode="full")[half:half + len(elev)]
 
 
 # ============================================================
 # 7. Gain & loss
 # ============================================================
 def compute_gain_loss(elev):
-    gain = 0
-    loss = 0
-    for i in range(1, len(elev)):
-        diff = elev[i] - elev[i - 1]
-        if diff > 0:
-            gain += diff
-        else:
-            loss -= diff
+    d = np.diff(np.asarray(elev, dtype=float))
+    gain = float(d[d > 0].sum())
+    loss = float(-d[d < 0].sum())
     return round(gain, 2), round(loss, 2)
 
 
 # ============================================================
 # 8. Slopes
 # ============================================================
-def compute_slopes(coords, elev):
-
-    def haversine(lat1, lon1, lat2, lon2):
-        R = 6371000
-        p1 = np.radians(lat1)
-        p2 = np.radians(lat2)
-        dlat = np.radians(lat2 - lat1)
-        dlon = np.radians(lon2 - lon1)
+def to_radians(coords):
+    """
+    Convert (lat, lon) pairs to radians once at the route boundary.
+    Returns (lat_rad, lon_rad, cos_lat) arrays for the haversine helpers.
+    """
+    arr = np.radians(np.asarray(coords, dtype=float).reshape(-1, 2))
+    lat, lon = arr[:, 0], arr[:, 1]
+    return lat, lon, np.cos(lat)
 
-        a = (np.sin(dlat/2)**2 +
-             np.cos(p1)*np.cos(p2)*np.sin(dlon/2)**2)
 
-        return 2 * R * np.arcsin(np.sqrt(a))
+def segment_distances_m(lat, lon, cos_lat):
+    """
+    Haversine length (m) of each consecutive segment, from radian arrays.
 
-    slopes = []
+    The terms are built in place (ufunc out=) so long GPX imports allocate
+    a couple of N-sized buffers instead of one per step.
+    """
+    # a = sin²(Δlat/2) + cos(lat1)·cos(lat2)·sin²(Δlon/2), reusing buffers
+    a = np.subtract(lat[1:], lat[:-1])
+    np.multiply(a, 0.5, out=a)
+    np.sin(a, out=a)
+    np.square(a, out=a)
+
+    b = np.subtract(lon[1:], lon[:-1])
+    np.multiply(b, 0.5, out=b)
+    np.sin(b, out=b)
+    np.square(b, out=b)
+    np.multiply(b, cos_lat[:-1], out=b)
+    np.multiply(b, cos_lat[1:], out=b)
+
+    np.add(a, b, out=a)
+    np.sqrt(a, out=a)
+    np.arcsin(a, out=a)
+    return np.multiply(a, 2 * 6371000, out=a)
+
+
+def compute_slopes(coords, elev, rad=None):
+    """
+    Grade (%) between consecutive points, as an ndarray.
+    Segment distances are computed in one vectorized haversine pass;
+    segments shorter than 1 m get a slope of 0.
 
-    for i in range(1, len(coords)):
-        lat1, lon1 = coords[i - 1]
-        lat2, lon2 = coords[i]
-        dist = haversine(lat1, lon1, lat2, lon2)
+    rad: optional precomputed to_radians(coords), to skip the conversion.
+    """
+    lat, lon, cos_lat = rad if rad is not None else to_radians(coords)
+    if len(lat) < 2:
+        return np.empty(0)
 
-        if dist < 1:
-            slopes.append(0)
-            continue
+    dist = segment_distances_m(lat, lon, cos_lat)
 
-        diff = elev[i] - elev[i - 1]
-        slopes.append(round((diff / dist) * 100, 3))  # grade %
+    slope = np.diff(np.asarray(elev, dtype=float))
+    np.divide(slope, dist, out=slope, where=dist >= 1)
+    slope[dist < 1] = 0.0
+    np.multiply(slope, 100, out=slope)   # grade %
 
-    return slopes
+    return np.round(slope, 3, out=slope)
 
 
 # ============================================================
@@ -238,7 +481,11 @@ def classify_difficulty(gain_m, max_slope):
 # 10. Main analyzer
 # ============================================================
 def analyze_route_elevation(coords):
-    if not coords:
+    """
+    Elevation profile, gain/loss, slopes and difficulty for a route.
+    "elevations" and "slopes" are ndarrays — render with NumpyJSONResponse.
+    """
+    if len(coords) == 0:
         return {
             "elevations": [],
             "elevation_gain_m": 0,
@@ -248,10 +495,11 @@ def analyze_route_elevation(coords):
             "difficulty": "Easy"
         }
 
+    rad = to_radians(coords)   # once per route; shared by distance helpers
     elev = get_elevation_profile(coords)
     gain, loss = compute_gain_loss(elev)
-    slopes = compute_slopes(coords, elev)
-    max_slope = max(abs(s) for s in slopes) if slopes else 0
+    slopes = compute_slopes(coords, elev, rad=rad)
+    max_slope = float(np.abs(slopes).max()) if slopes.size else 0
     diff = classify_difficulty(gain, max_slope)
 
     return {
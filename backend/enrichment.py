@@ -5,7 +5,7 @@
 # Returns landmarks, food, parks, neighborhood flavor, highlights, and summary
 # for a given route or location.
 
-import requests
+import orjson
 from backend.config import (
     OVERPASS_URL,
     OVERPASS_TIMEOUT,
@@ -13,8 +13,9 @@ from backend.config import (
     ENRICHMENT_MAX_LANDMARKS,
     ENRICHMENT_MAX_FOOD,
 )
-from backend.utils.common import coords_bbox, point_to_route_distance_m, haversine
+from backend.utils.common import coords_bbox, points_to_route_distance_m, haversine
 from backend.cache import overpass_cache, overpass_key
+from backend.utils.http import session as http
 
 
 # ---------------------------------------------------------------------------
@@ -46,7 +47,7 @@ def _fetch_overpass_raw(bbox: dict) -> list[dict]:
 
     query = _build_overpass_query(bbox)
     try:
-        r = requests.post(
+        r = http.post(
             OVERPASS_URL,
             data={"data": query},
             timeout=OVERPASS_TIMEOUT + 2,
@@ -54,7 +55,7 @@ def _fetch_overpass_raw(bbox: dict) -> list[dict]:
         )
         if r.status_code != 200:
             return []
-        elements = r.json().get("elements", [])
+        elements = orjson.loads(r.content).get("elements", [])
     except Exception:
         elements = []
 
@@ -102,26 +103,30 @@ _EMOJI = {
 # Build POI list from Overpass elements
 # ---------------------------------------------------------------------------
 def _build_pois(elements: list[dict], coords: list[tuple], corridor_m: int) -> list[dict]:
-    pois = []
-    seen: set = set()
-
+    candidates = []
     for el in elements:
         if el.get("type") != "node":
             continue
-        osm_id = el.get("id")
-        if osm_id in seen:
-            continue
-
         tags = el.get("tags", {})
         name = tags.get("name") or tags.get("name:en") or tags.get("brand")
         if not name:
             continue
-
         lat, lon = el.get("lat"), el.get("lon")
         if lat is None or lon is None:
             continue
+        candidates.append((el.get("id"), tags, name, lat, lon))
 
-        dist_m = point_to_route_distance_m(lat, lon, coords, sample_every=4)
+    # Distance to route for every candidate in one vectorized pass
+    dists = points_to_route_distance_m(
+        [c[3] for c in candidates], [c[4] for c in candidates], coords, sample_every=4,
+    )
+
+    pois = []
+    seen: set = set()
+
+    for (osm_id, tags, name, lat, lon), dist_m in zip(candidates, dists.tolist()):
+        if osm_id in seen:
+            continue
         if dist_m > corridor_m:
             continue
 
@@ -0,0 +1,33 @@
+# backend/gpx/export_gpx.py
+
+from xml.sax.saxutils import escape
+
+# Points per yielded chunk — large enough to avoid per-point write overhead,
+# small enough that long routes never build the whole document in memory
+CHUNK_POINTS = 500
+
+
+def iter_gpx(coords, name: str = "WalkWithMe Route"):
+    """
+    Yield a GPX 1.1 track document for coords in chunks, for StreamingResponse.
+    Coordinates are written at 6 decimals (~0.1 m); name is XML-escaped.
+    """
+    yield f"""<?xml version="1.0" encoding="UTF-8"?>
+<gpx version="1.1" creator="WalkWithMe"
+     xmlns="http://www.topografix.com/GPX/1/1">
+  <trk>
+    <name>{escape(name)}</name>
+    <trkseg>
+"""
+    buf = []
+    for lat, lon in coords:
+        buf.append(f'    <trkpt lat="{lat:.6f}" lon="{lon:.6f}"></trkpt>\n')
+        if len(buf) >= CHUNK_POINTS:
+            yield "".join(buf)
+            buf.clear()
+    if buf:
+        yield "".join(buf)
+
+    yield """    </trkseg>
+  </trk>
+</gpx>"""
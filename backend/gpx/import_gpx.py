@@ -1,64 +1,43 @@
 # backend/gpx/import_gpx.py
 
+import io
 import xml.etree.ElementTree as ET
+
+import numpy as np
 from fastapi import UploadFile
 
 # Some GPX files have namespaces like:
 # <gpx xmlns="http://www.topografix.com/GPX/1/1">
 GPX_NS = {"gpx": "http://www.topografix.com/GPX/1/1"}
 
+_TRKPT = f"{{{GPX_NS['gpx']}}}trkpt"   # <trk><trkseg><trkpt lat=".." lon="..">
+_RTEPT = f"{{{GPX_NS['gpx']}}}rtept"   # <rte><rtept lat=".." lon="..">
+_WPT = f"{{{GPX_NS['gpx']}}}wpt"       # <wpt lat=".." lon="..">
 
-def _parse_trkpts(root):
-    coords = []
-    # Extract track points: <trk><trkseg><trkpt lat=".." lon="..">
-    for trkpt in root.findall(".//gpx:trkpt", GPX_NS):
-        lat = float(trkpt.attrib.get("lat"))
-        lon = float(trkpt.attrib.get("lon"))
-        coords.append((lat, lon))
-    return coords
 
+def parse_gpx(data: bytes):
+    """
+    Stream-parse GPX bytes and return an (N, 2) float array of (lat, lon).
 
-def _parse_rtepts(root):
-    coords = []
-    # Extract route points: <rte><rtept lat=".." lon="..">
-    for rtept in root.findall(".//gpx:rtept", GPX_NS):
-        lat = float(rtept.attrib.get("lat"))
-        lon = float(rtept.attrib.get("lon"))
-        coords.append((lat, lon))
-    return coords
+    A single iterparse pass collects track, route and waypoint coordinates,
+    clearing each element once read so multi-MB traces never build a full DOM.
+    Preference order: trkpts (most common) → rtepts → wpts.
+    """
+    points = {_TRKPT: [], _RTEPT: [], _WPT: []}
 
+    for _, el in ET.iterparse(io.BytesIO(data), events=("end",)):
+        bucket = points.get(el.tag)
+        if bucket is not None:
+            bucket.append((float(el.get("lat")), float(el.get("lon"))))
+        el.clear()
 
-def _parse_wpts(root):
-    coords = []
-    # Extract waypoints: <wpt lat=".." lon="..">
-    for wpt in root.findall(".//gpx:wpt", GPX_NS):
-        lat = float(wpt.attrib.get("lat"))
-        lon = float(wpt.attrib.get("lon"))
-        coords.append((lat, lon))
-    return coords
+    coords = points[_TRKPT] or points[_RTEPT] or points[_WPT]
+    return np.array(coords, dtype=float).reshape(-1, 2)
 
 
 async def import_gpx(file: UploadFile):
     """
-    Parses an uploaded GPX file and returns list of (lat, lon).
+    Parses an uploaded GPX file and returns an (N, 2) array of (lat, lon).
     """
-
     data = await file.read()
-    root = ET.fromstring(data)
-
-    # Try trkpts first (most common)
-    coords = _parse_trkpts(root)
-    if coords:
-        return coords
-
-    # If no trkpts, try rtepts
-    coords = _parse_rtepts(root)
-    if coords:
-        return coords
-
-    # If no routes either, fallback to waypoints
-    coords = _parse_wpts(root)
-    if coords:
-        return coords
-
-    return []
+    return parse_gpx(data)
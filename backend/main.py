@@ -1,16 +1,17 @@
 # backend/main.py
 
-import math
+import heapq
 import logging
+import re
 from concurrent.futures import ThreadPoolExecutor
-from typing import Literal
+from typing import Any, Literal
 
-import polyline
+import numpy as np
+import openai
 import rapidfuzz
-import requests
 from fastapi import FastAPI, HTTPException, Query, Request, UploadFile, File
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import Response
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
 
 from backend.config import GOOGLE_PLACES_API_KEY, OPENAI_API_KEY
@@ -18,19 +19,30 @@ from backend.routing import get_route, ALLOWED_MODES
 from backend.loop_assistant.models import LoopAssistantRequest
 from backend.loop_assistant.service import run_loop_assistant
 from backend.gpx.import_gpx import import_gpx
+from backend.gpx.export_gpx import iter_gpx
 from backend.elevation import analyze_route_elevation
 from backend.enrichment import enrich_route, find_nearby
 from backend.detours import compute_detours
 from backend.personas import get_persona_for_location, get_persona
 from backend.themes import get_all_themes, get_theme, get_themes_by_tag
 from backend.walks import analyze_coverage, suggest_unexplored
-from backend.cache import route_cache, route_key
+from backend.cache import (
+    route_cache, route_key, autocomplete_cache, autocomplete_key,
+    provider_cache, provider_key, PROVIDER_NEGATIVE_TTL, ip_bias_cache,
+    vision_cache, vision_key, autocomplete_prefix_index, AUTOCOMPLETE_MIN_UPSTREAM_LEN,
+    region_key, inflight,
+)
+from backend.utils.common import (
+    encode_polyline6, equirect_many, haversine_many, make_haversine_from, simplify_rdp,
+)
+from backend.utils.http import get_json
 from backend.utils.geo import parse_location, reverse_geocode
+from backend.utils.responses import NumpyJSONResponse
 
 logging.basicConfig(level=logging.INFO, format="%(levelname)s %(name)s %(message)s")
 logger = logging.getLogger("walkwithme")
 
-app = FastAPI(title="WalkWithMe API", version="3.0")
+app = FastAPI(title="WalkWithMe API", version="3.0", default_response_class=NumpyJSONResponse)
 
 app.add_middleware(
     CORSMiddleware,
@@ -42,33 +54,88 @@ app.add_middleware(
 
 HEADERS = {"User-Agent": "WalkWithMe/3.0"}
 
+# Configure the OpenAI SDK once at import rather than on every /vision call
+openai.api_key = OPENAI_API_KEY or None
+
 # Modes that produce deterministic results — safe to cache
 _CACHEABLE_MODES = {"shortest", "scenic", "safe", "explore", "elevation"}
 
 
+# Autocomplete: queries mentioning any of these (substring match) may go to Google
+_POI_KEYWORDS = ("cafe", "coffee", "restaurant", "food", "pizza", "thai", "gym", "park",
+                 "museum", "mall", "hotel", "bar", "burger", "boba", "bakery", "dessert",
+                 "ramen", "sushi", "near me")
+_POI_RE = re.compile("|".join(map(re.escape, _POI_KEYWORDS)), re.IGNORECASE)
+
+
 # ---------------------------------------------------------------------------
 # Helpers
 # ---------------------------------------------------------------------------
-def _haversine(lat1, lon1, lat2, lon2):
-    R = 6371.0
-    dlat = math.radians(lat2 - lat1)
-    dlon = math.radians(lon2 - lon1)
-    a = (math.sin(dlat / 2) ** 2
-         + math.cos(math.radians(lat1)) * math.cos(math.radians(lat2))
-         * math.sin(dlon / 2) ** 2)
-    return R * 2 * math.asin(math.sqrt(max(0.0, a)))
-
-
-def _ip_bias(request: Request) -> tuple[float | None, float | None]:
+def _ip_bias(request: Request, fetch: bool = True) -> tuple[float | None, float | None]:
+    """Client location bias from its IP; with fetch=False only a cached bias is used."""
     try:
         ip = request.headers.get("x-forwarded-for", "").split(",")[0].strip()
         if not ip:
             ip = request.client.host
-        r = requests.get(f"https://ipapi.co/{ip}/json/", timeout=2).json()
-        return float(r["latitude"]), float(r["longitude"])
     except Exception:
         return None, None
 
+    cached = ip_bias_cache.get(ip)
+    if cached is not None:
+        return cached
+    if not fetch:
+        return None, None
+
+    def lookup():
+        r = get_json(f"https://ipapi.co/{ip}/json/", timeout=2)
+        try:
+            bias = float(r["latitude"]), float(r["longitude"])
+        except (TypeError, KeyError, ValueError):
+            return None, None
+        ip_bias_cache.set(ip, bias)
+        return bias
+
+    return inflight.do(f"ip:{ip}", lookup)
+
+
+def _top_k(scores: np.ndarray, idx: np.ndarray, k: int) -> list[int]:
+    """
+    Indices from idx with the k highest scores, best first. Ties keep input
+    order, exactly like a stable descending sort truncated to k.
+    """
+    if len(idx) <= 50:
+        return heapq.nlargest(k, idx.tolist(), key=scores.__getitem__)
+    s = scores[idx]
+    if k < len(idx):
+        cutoff = np.partition(s, -k)[-k]
+        keep = s >= cutoff          # all ties at the cutoff survive the partition
+        idx, s = idx[keep], s[keep]
+    return idx[np.argsort(-s, kind="stable")[:k]].tolist()
+
+
+def _cached_search(key: str, fetch) -> list:
+    """
+    Provider-result cache wrapper. fetch() returns a list, or None on error.
+    Errors are never cached; empty results are cached briefly (negative cache).
+    Concurrent misses for the same key share a single upstream fetch.
+    """
+    cached = provider_cache.get(key)
+    if cached is not None:
+        return cached
+
+    def load():
+        # Re-check: a call for this key may have finished since the miss above
+        cached = provider_cache.get(key)
+        if cached is not None:
+            return cached
+        results = fetch()
+        if results is None:
+            return []
+        provider_cache.set(key, results, ttl=None if results else PROVIDER_NEGATIVE_TTL)
+        return results
+
+    return inflight.do(key, load)
+
 
 # ---------------------------------------------------------------------------
 # GET /
@@ -90,20 +157,44 @@ def autocomplete(
     limit: int = Query(default=7, ge=1, le=20),
 ):
     q = q.strip()
-    poi_kw = {"cafe","coffee","restaurant","food","pizza","thai","gym","park","museum",
-              "mall","hotel","bar","burger","boba","bakery","dessert","ramen","sushi"}
-    looks_like_poi = any(k in q.lower() for k in poi_kw) or "near me" in q.lower()
+    looks_like_poi = _POI_RE.search(q) is not None
+
+    # 1–2 characters: answer from popular past completions without going
+    # upstream — not even ipapi; an IP bias is only used if it is already cached
+    short = len(q) < AUTOCOMPLETE_MIN_UPSTREAM_LEN
+    ip_biased = user_lat is None or user_lon is None
+
+    if ip_biased:
+        user_lat, user_lon = _ip_bias(request, fetch=not short)
+    region = region_key(user_lat, user_lon)
+
+    if short:
+        hits = autocomplete_prefix_index.lookup(q, region, limit)
+        if not hits and region is not None:
+            hits = autocomplete_prefix_index.lookup(q, None, limit)
+        if hits:
+            return hits
+        # Cold index (fresh start, eviction, quiet region): search upstream
+        if ip_biased and user_lat is None:
+            user_lat, user_lon = _ip_bias(request)
+            region = region_key(user_lat, user_lon)
 
-    if user_lat is None or user_lon is None:
-        user_lat, user_lon = _ip_bias(request)
     geo_bias = user_lat is not None and user_lon is not None
 
+    ckey = autocomplete_key(q, user_lat, user_lon, limit)
+    cached = autocomplete_cache.get(ckey)
+    if cached is not None:
+        autocomplete_prefix_index.record(q, region, cached)
+        return cached
+
     def fetch_photon():
+        params = {"q": q, "limit": limit}
+        if geo_bias:
+            params.update({"lat": user_lat, "lon": user_lon})
+        r = get_json("https://photon.komoot.io/api/", params=params, timeout=4)
+        if r is None:
+            return None
         try:
-            params = {"q": q, "limit": limit}
-            if geo_bias:
-                params.update({"lat": user_lat, "lon": user_lon})
-            r = requests.get("https://photon.komoot.io/api/", params=params, timeout=4).json()
             out = []
             for f in r.get("features", []):
                 props = f["properties"]
@@ -114,62 +205,94 @@ def autocomplete(
                 coords = f["geometry"]["coordinates"]
                 out.append({"label": label, "lat": coords[1], "lon": coords[0], "source": "photon"})
             return out
-        except Exception:
-            return []
+        except (AttributeError, KeyError, IndexError, TypeError):
+            return None
 
     def fetch_nominatim():
+        r = get_json(
+            "https://nominatim.openstreetmap.org/search",
+            params={"q": q, "format": "json", "limit": limit, "addressdetails": 1},
+            headers=HEADERS, timeout=4,
+        )
+        if r is None:
+            return None
         try:
-            r = requests.get(
-                "https://nominatim.openstreetmap.org/search",
-                params={"q": q, "format": "json", "limit": limit, "addressdetails": 1},
-                headers=HEADERS, timeout=4,
-            ).json()
             return [{"label": i["display_name"], "lat": float(i["lat"]),
                      "lon": float(i["lon"]), "source": "nominatim"} for i in r]
-        except Exception:
-            return []
+        except (KeyError, TypeError, ValueError):
+            return None
+
+    def fetch_google():
+        params = {"query": q, "key": GOOGLE_PLACES_API_KEY}
+        if geo_bias:
+            params.update({"location": f"{user_lat},{user_lon}", "radius": 1500})
+        gr = get_json(
+            "https://maps.googleapis.com/maps/api/place/textsearch/json",
+            params=params, timeout=4,
+        )
+        if gr is None:
+            return None
+        try:
+            return [{"label": p.get("name"),
+                     "lat": p["geometry"]["location"]["lat"],
+                     "lon": p["geometry"]["location"]["lng"],
+                     "source": "google"} for p in gr.get("results", [])]
+        except (AttributeError, KeyError, TypeError) as e:
+            logger.warning("Google Places error: %s", e)
+            return None
+
+    def key(provider):
+        return provider_key(provider, q, user_lat, user_lon, limit)
 
+    # Submit both before waiting so the two round-trips overlap
     with ThreadPoolExecutor(max_workers=2) as ex:
-        photon = ex.submit(fetch_photon).result()
-        nominatim = ex.submit(fetch_nominatim).result()
+        photon_f = ex.submit(_cached_search, key("photon"), fetch_photon)
+        nominatim_f = ex.submit(_cached_search, key("nominatim"), fetch_nominatim)
+        photon, nominatim = photon_f.result(), nominatim_f.result()
 
     osm = photon + nominatim
     logger.info("autocomplete: %d OSM results for '%s'", len(osm), q)
 
     google = []
     if len(q) >= 4 and GOOGLE_PLACES_API_KEY and (not osm or looks_like_poi):
-        try:
-            params = {"query": q, "key": GOOGLE_PLACES_API_KEY}
-            if geo_bias:
-                params.update({"location": f"{user_lat},{user_lon}", "radius": 1500})
-            gr = requests.get(
-                "https://maps.googleapis.com/maps/api/place/textsearch/json",
-                params=params, timeout=4,
-            ).json()
-            for p in gr.get("results", []):
-                google.append({"label": p.get("name"),
-                               "lat": p["geometry"]["location"]["lat"],
-                               "lon": p["geometry"]["location"]["lng"],
-                               "source": "google"})
-        except Exception as e:
-            logger.warning("Google Places error: %s", e)
+        google = _cached_search(key("google"), fetch_google)
 
-    ranked = []
-    for o in osm + google:
-        score = rapidfuzz.fuzz.ratio(q.lower(), o["label"].lower())
-        if geo_bias:
-            dist = _haversine(user_lat, user_lon, o["lat"], o["lon"])
-            if dist > 50 and score < 85:
-                continue
-            score += max(0, 20 - dist)
-            if dist < 10:
-                score += 30
-        if o["source"] == "photon":
-            score += 10
-        ranked.append({**o, "_score": score})
+    candidates = osm + google
+    if not candidates:
+        return []
 
-    ranked.sort(key=lambda x: x["_score"], reverse=True)
-    return [{"label": o["label"], "lat": o["lat"], "lon": o["lon"]} for o in ranked[:limit]]
+    # Struct-of-arrays view of the merged candidates: one pass over the dicts,
+    # then everything below works on parallel arrays
+    labels, lat_list, lon_list, sources = zip(
+        *((o["label"], o["lat"], o["lon"], o["source"]) for o in candidates)
+    )
+    lats = np.array(lat_list, dtype=float)
+    lons = np.array(lon_list, dtype=float)
+
+    # Normalize query and labels exactly once, then score with processor=None
+    norm = rapidfuzz.utils.default_process
+    scores = rapidfuzz.process.cdist(
+        [norm(q)], [norm(label) for label in labels],
+        scorer=rapidfuzz.fuzz.ratio, processor=None, dtype=np.float64,
+    )[0]
+    keep = np.ones(len(candidates), dtype=bool)
+    if geo_bias:
+        # Cheap flat-Earth distance for the bonuses; exact haversine only for
+        # candidates far enough out to be near (or past) the 50 km cutoff
+        dist = equirect_many(user_lat, user_lon, lats, lons)
+        far = dist > 40
+        if far.any():
+            dist[far] = haversine_many(user_lat, user_lon, lats[far], lons[far])
+        keep = (dist <= 50) | (scores >= 85)
+        scores += np.maximum(0, 20 - dist) + np.where(dist < 10, 30, 0)
+    scores += 10 * (np.array(sources) == "photon")
+
+    order = _top_k(scores, np.flatnonzero(keep), limit)
+    results = [{"label": labels[i], "lat": lat_list[i], "lon": lon_list[i]} for i in order]
+    if results:   # empty usually means upstream trouble — don't pin it
+        autocomplete_cache.set(ckey, results)
+        autocomplete_prefix_index.record(q, region, results)
+    return results
 
 
 # ---------------------------------------------------------------------------
@@ -234,18 +357,28 @@ def route(
         return enrich_route(coords) if enrich else None
 
     def do_elev():
-        return analyze_route_elevation(coords) if elevation else None
-
-    with ThreadPoolExecutor(max_workers=2) as ex:
-        enrichment_data = ex.submit(do_enrich).result()
-        elevation_data = ex.submit(do_elev).result()
+        # One contiguous (N, 2) array; the elevation pipeline is all NumPy
+        return analyze_route_elevation(np.asarray(coords, dtype=np.float64)) if elevation else None
+
+    if enrich and elevation:
+        with ThreadPoolExecutor(max_workers=2) as ex:
+            enrich_f = ex.submit(do_enrich)
+            elev_f = ex.submit(do_elev)
+            enrichment_data, elevation_data = enrich_f.result(), elev_f.result()
+    else:
+        enrichment_data, elevation_data = do_enrich(), do_elev()
 
+    # Response fields go on a copy so the route_cache entry stays untouched.
+    # Enrichment, elevation and waypoints above used the full path; the client
+    # gets it RDP-thinned (~2 m) as "coordinates", and at full fidelity as the
+    # encoded polyline6 string "polyline".
+    result = {**result, "coordinates": simplify_rdp(coords), "polyline": encode_polyline6(coords)}
     if enrichment_data is not None:
         result["enrichment"] = enrichment_data
     if elevation_data is not None:
         result["elevation"] = elevation_data
 
-    return result
+    return NumpyJSONResponse(result)   # elevation profile holds ndarrays
 
 
 def _do_route(lat1, lon1, end_tuple, mode, duration, loop_theme):
@@ -436,18 +569,29 @@ def places_search(
     if user_lat is None or user_lon is None:
         raise HTTPException(400, "Missing user location.")
 
-    try:
-        r = requests.get(
+    ckey = provider_key("places", q, user_lat, user_lon, 0)
+
+    def fetch_places():
+        r = get_json(
             "https://maps.googleapis.com/maps/api/place/textsearch/json",
             params={"query": q, "location": f"{user_lat},{user_lon}",
                     "radius": 3000, "key": GOOGLE_PLACES_API_KEY},
             timeout=5,
-        ).json()
-    except Exception as e:
-        raise HTTPException(500, f"Google Places failed: {e}")
-
+        )
+        if not isinstance(r, dict):
+            raise HTTPException(500, "Google Places failed.")
+        places = r.get("results", [])
+        provider_cache.set(ckey, places, ttl=None if places else PROVIDER_NEGATIVE_TTL)
+        return places
+
+    places = provider_cache.get(ckey)
+    if places is None:
+        places = inflight.do(ckey, fetch_places)
+
+    # distance_km is per-user, so it's computed after the cache, not stored in it
+    dist_from_user = make_haversine_from(user_lat, user_lon)
     results = []
-    for place in r.get("results", []):
+    for place in places:
         loc = place["geometry"]["location"]
         p_lat, p_lon = loc["lat"], loc["lng"]
         results.append({
@@ -457,7 +601,7 @@ def places_search(
             "review_count": place.get("user_ratings_total"),
             "lat": p_lat, "lon": p_lon,
             "open_now": place.get("opening_hours", {}).get("open_now"),
-            "distance_km": round(_haversine(user_lat, user_lon, p_lat, p_lon), 3),
+            "distance_km": round(dist_from_user(p_lat, p_lon), 3),
         })
     return {"query": q, "count": len(results), "results": results}
 
@@ -480,10 +624,10 @@ def reverse_geocode_endpoint(coords: str):
 @app.post("/import_gpx")
 async def import_gpx_endpoint(file: UploadFile = File(...)):
     coords = await import_gpx(file)
-    if not coords:
+    if len(coords) == 0:
         raise HTTPException(400, "No coordinates found in GPX file.")
     elev = analyze_route_elevation(coords)
-    return {"points": len(coords), "coordinates": coords, "elevation": elev}
+    return NumpyJSONResponse({"points": len(coords), "coordinates": coords, "elevation": elev})
 
 
 # ---------------------------------------------------------------------------
@@ -529,32 +673,45 @@ def export_gpx(
     if not coords:
         raise HTTPException(404, "No route coordinates.")
 
-    trkpts = "\n".join(
-        f'    <trkpt lat="{lat}" lon="{lon}"></trkpt>' for lat, lon in coords
-    )
-    gpx = f"""<?xml version="1.0" encoding="UTF-8"?>
-<gpx version="1.1" creator="WalkWithMe"
-     xmlns="http://www.topografix.com/GPX/1/1">
-  <trk>
-    <name>{name}</name>
-    <trkseg>
-{trkpts}
-    </trkseg>
-  </trk>
-</gpx>"""
-
-    return Response(
-        content=gpx,
+    return StreamingResponse(
+        iter_gpx(coords, name),
         media_type="application/gpx+xml",
-        headers={"Content-Disposition": f'attachment; filename="route.gpx"'},
+        headers={"Content-Disposition": 'attachment; filename="route.gpx"'},
     )
 
 
 # ---------------------------------------------------------------------------
 # POST /vision
 # ---------------------------------------------------------------------------
+# Fixed per-request prefix — kept byte-identical so the provider can reuse it
+VISION_SYSTEM_PROMPT = (
+    "You are WALKR AR Vision — pedestrian safety assistant.\n"
+    "Analyze YOLO detections, heading, and distance to next turn.\n"
+    "Only warn about hazards directly in the walking path.\n"
+    "Respond ONLY in JSON: {\"hazards\": [], \"path_status\": \"\", \"recommendation\": \"\"}\n"
+    "hazards: raw YOLO labels (\"person\", \"car\", \"bike\").\n"
+    "path_status: \"clear\" | \"partially blocked\" | \"obstructed\" | \"uncertain\"\n"
+    "recommendation: short phrase (\"continue\", \"slow down\", \"shift right\")"
+)
+
+
+# YOLO (COCO) labels worth asking the model about; anything else can't block a walker
+_HAZARD_LABELS = frozenset({
+    "person", "bicycle", "bike", "motorcycle", "car", "truck", "bus", "dog",
+})
+
+# Returned without a model call when no detection is a potential hazard
+_CLEAR_ANALYSIS = '{"hazards": [], "path_status": "clear", "recommendation": "continue"}'
+
+
+def _detection_label(d) -> str:
+    if isinstance(d, dict):
+        return str(d.get("label") or d.get("class") or d.get("name") or "").lower()
+    return str(d).lower()
+
+
 class VisionRequest(BaseModel):
-    detections: list
+    detections: list[dict[str, Any] | str]   # YOLO boxes ({"label", "conf", ...}) or bare labels
     heading: float | None = None
     distance_to_next: float | None = None
 
@@ -564,36 +721,38 @@ async def vision(payload: VisionRequest):
     if not OPENAI_API_KEY:
         raise HTTPException(503, "Vision service not configured.")
 
-    import openai
-    openai.api_key = OPENAI_API_KEY
-
-    system_prompt = (
-        "You are WALKR AR Vision — pedestrian safety assistant.\n"
-        "Analyze YOLO detections, heading, and distance to next turn.\n"
-        "Only warn about hazards directly in the walking path.\n"
-        "Respond ONLY in JSON: {\"hazards\": [], \"path_status\": \"\", \"recommendation\": \"\"}\n"
-        "hazards: raw YOLO labels (\"person\", \"car\", \"bike\").\n"
-        "path_status: \"clear\" | \"partially blocked\" | \"obstructed\" | \"uncertain\"\n"
-        "recommendation: short phrase (\"continue\", \"slow down\", \"shift right\")"
-    )
+    # Only potential hazards reach the model; frames without any need no call
+    detections = [d for d in payload.detections if _detection_label(d) in _HAZARD_LABELS]
+    if not detections:
+        return {"ok": True, "analysis": _CLEAR_ANALYSIS}
+
+    ckey = vision_key(detections, payload.heading, payload.distance_to_next)
+    cached = vision_cache.get(ckey)
+    if cached is not None:
+        return {"ok": True, "analysis": cached}
 
     try:
-        resp = openai.ChatCompletion.create(
+        # acreate awaits the round-trip instead of blocking the event loop
+        resp = await openai.ChatCompletion.acreate(
             model="gpt-4o-mini",
             messages=[
-                {"role": "system", "content": system_prompt},
+                {"role": "system", "content": VISION_SYSTEM_PROMPT},
                 {"role": "user", "content": (
-                    f"Detections: {payload.detections}\n"
+                    f"Detections: {detections}\n"
                     f"Heading: {payload.heading}\n"
                     f"Distance to next: {payload.distance_to_next}"
                 )},
             ],
             max_tokens=150, temperature=0.1,
+            response_format={"type": "json_object"},
         )
-        return {"ok": True, "analysis": resp.choices[0].message["content"]}
+        analysis = resp.choices[0].message["content"]
     except Exception as e:
         raise HTTPException(500, f"Vision failed: {e}")
 
+    vision_cache.set(ckey, analysis)
+    return {"ok": True, "analysis": analysis}
+
 
 # ---------------------------------------------------------------------------
 # POST /loop_assistant — natural-language loop request → structured options
@@ -2,12 +2,16 @@
 
 import math
 import random
-import polyline
-from concurrent.futures import ThreadPoolExecutor, as_completed
+import numpy as np
 
-from backend.valhalla_client import valhalla_route, valhalla_route_many
+from backend.valhalla_client import valhalla_route_many
 from backend.utils.common import (
+    decode_polyline6,
+    decode_shape,
+    bearings_many,
+    haversine_many,
     haversine,
+    equirect_path_km,
     simplify_waypoints,
     compute_next_turn,
     parse_maneuvers,
@@ -18,13 +22,13 @@ from backend.utils.common import (
 # ---------------------------------------------------------------------------
 # Costing presets
 # ---------------------------------------------------------------------------
-COSTING_PRESETS: list[tuple[str, dict]] = [
+COSTING_PRESETS: tuple[tuple[str, dict], ...] = (
     ("base",       {"pedestrian": {"use_roads": 0.5, "use_hills": 0.5, "use_lit": 0.5}}),
     ("scenic",     {"pedestrian": {"use_roads": 0.2, "use_hills": 0.4, "use_lit": 0.5}}),
     ("safe_day",   {"pedestrian": {"use_roads": 0.2, "use_hills": 0.3, "use_lit": 0.6}}),
     ("safe_night", {"pedestrian": {"use_roads": 0.1, "use_hills": 0.3, "use_lit": 1.5}}),
     ("explore",    {"pedestrian": {"use_roads": 0.3, "use_hills": 0.2, "use_lit": 0.4}}),
-]
+)
 
 COSTING_WEATHER_EXTRAS: dict[str, tuple] = {
     "rain": ("rain_route", {"pedestrian": {"use_roads": 0.2, "use_hills": 0.1, "use_lit": 0.9}}),
@@ -43,59 +47,102 @@ LOOP_THEME_COSTING: dict[str, tuple[str, dict]] = {
 }
 
 
-def _build_costing_list(weather: str) -> list[tuple[str, dict]]:
-    presets = list(COSTING_PRESETS)
-    if weather in COSTING_WEATHER_EXTRAS:
-        presets.append(COSTING_WEATHER_EXTRAS[weather])
-    return presets
+# Full costing list per weather, built once at import — requests only look it up
+_COSTINGS_BY_WEATHER: dict[str, tuple] = {
+    weather: COSTING_PRESETS + (extra,) for weather, extra in COSTING_WEATHER_EXTRAS.items()
+}
+
+
+def _build_costing_list(weather: str) -> tuple[tuple[str, dict], ...]:
+    return _COSTINGS_BY_WEATHER.get(weather, COSTING_PRESETS)
+
+
+# Base score per costing label, weather that makes any walk less pleasant,
+# and the labels that earn the night-time safety bonus
+_LABEL_SCORE: dict[str, int] = {
+    "base": 1, "scenic": 3, "explore": 2, "safe_day": 2,
+    "safe_night": 4, "rain_route": 2, "snow_route": 3,
+}
+_BAD_WEATHER = frozenset({"rain", "snow", "hot"})
+_SAFE_LABELS = frozenset({"safe_day", "safe_night"})
+
+
+def _make_scorer(weather: str, night: bool):
+    """
+    Return score(label, length_km) with this request's weather and night
+    folded into a per-label constant, so each call is one lookup and a subtract.
+    """
+    penalty = 1.0 if weather in _BAD_WEATHER else 0.0
+    fixed = {
+        label: base - penalty + (2.0 if night and label in _SAFE_LABELS else 0.0)
+        for label, base in _LABEL_SCORE.items()
+    }
+    default = 1 - penalty
 
+    def score(label: str, length_km: float) -> float:
+        return fixed.get(label, default) - length_km / 10.0
 
-def _score_route(label: str, weather: str, night: bool, length_km: float) -> float:
-    score = {"base": 1, "scenic": 3, "explore": 2, "safe_day": 2,
-             "safe_night": 4, "rain_route": 2, "snow_route": 3}.get(label, 1)
-    if weather in ("rain", "snow", "hot"):
-        score -= 1.0
-    if night and "safe" in label:
-        score += 2.0
-    score -= length_km / 10.0
     return score
 
 
 # ---------------------------------------------------------------------------
-# get_ai_best_route — parallel Valhalla calls
+# get_ai_best_route — parallel Valhalla calls, pruned by score upper bound
 # ---------------------------------------------------------------------------
 def get_ai_best_route(start: tuple, end: tuple) -> dict:
     lat, lon = start
     weather, night = get_weather_and_night(lat, lon)
     presets = _build_costing_list(weather)
 
-    jobs = [(label, start, end, "pedestrian", options) for label, options in presets]
-    results = valhalla_route_many(jobs, max_workers=6)
-
-    candidates = []
-    for label, result in results:
-        if "trip" not in result:
+    # A route can't be much shorter than the straight line, so scoring each
+    # preset at that length bounds what it could possibly score
+    score = _make_scorer(weather, night)
+    min_km = 0.9 * haversine(lat, lon, end[0], end[1])
+    bound = {label: score(label, min_km) for label, _ in presets}
+    top = max(bound.values())
+
+    # Wave 1 routes only the presets with the highest bound; wave 2 routes the
+    # rest only if they could still beat the best wave-1 score (rarely).
+    waves = (
+        [p for p in presets if bound[p[0]] == top],
+        [p for p in presets if bound[p[0]] < top],
+    )
+    # Running best as ((score, -preset index), label, result): highest score
+    # wins, ties go to the earlier preset
+    best = None
+    order = {label: i for i, (label, _) in enumerate(presets)}
+    for wave in waves:
+        if best is not None:
+            wave = [p for p in wave if bound[p[0]] > best[0][0]]
+        if not wave:
             continue
-        leg = result["trip"]["legs"][0]
-        summary = result["trip"]["summary"]
-        coords = polyline.decode(leg["shape"], precision=6)
-        steps = parse_maneuvers(leg)
-        length_km = summary.get("length", 1)
-        score = _score_route(label, weather, night, length_km)
-        candidates.append({
-            "label": label, "score": score,
-            "coordinates": coords,
-            "waypoints": simplify_waypoints(coords),
-            "steps": steps,
-            "next_turn": compute_next_turn(steps, coords),
-            "distance_m": round(length_km * 1000),
-            "duration_s": int(summary.get("time", 0)),
-        })
-
-    if not candidates:
+        jobs = [(label, start, end, "pedestrian", options) for label, options in wave]
+        for label, result in valhalla_route_many(jobs, max_workers=6):
+            if "trip" not in result:
+                continue
+            length_km = result["trip"]["summary"].get("length", 1)
+            rank = (score(label, length_km), -order[label])
+            if best is None or rank > best[0]:
+                best = (rank, label, result)
+
+    if best is None:
         return {"error": "Could not generate any route candidates"}
 
-    best = max(candidates, key=lambda c: c["score"])
+    # Only the winner is decoded
+    _, label, result = best
+    leg = result["trip"]["legs"][0]
+    summary = result["trip"]["summary"]
+    coords = decode_shape(leg["shape"])
+    steps = parse_maneuvers(leg)
+    best = {
+        "label": label,
+        "coordinates": coords,
+        "waypoints": simplify_waypoints(coords),
+        "steps": steps,
+        "next_turn": compute_next_turn(steps, coords),
+        "distance_m": round(summary.get("length", 1) * 1000),
+        "duration_s": int(summary.get("time", 0)),
+    }
+
     return {
         "mode": "best", "variant": best["label"],
         "weather": weather, "night": night,
@@ -111,20 +158,21 @@ def get_ai_best_route(start: tuple, end: tuple) -> dict:
 # ---------------------------------------------------------------------------
 # Loop safety filter
 # ---------------------------------------------------------------------------
-_BAD_CLASSES = {"motorway", "motorway_link", "trunk", "trunk_link", "primary", "primary_link"}
-_BAD_USES = {"ferry", "rail", "construction", "bridleway"}
-_BAD_SURFACES = {"metal", "grass", "gravel", "ground", "dirt", "clay"}
+_BAD_CLASSES = frozenset({"motorway", "motorway_link", "trunk", "trunk_link", "primary", "primary_link"})
+_BAD_USES = frozenset({"ferry", "rail", "construction", "bridleway"})
+_BAD_SURFACES = frozenset({"metal", "grass", "gravel", "ground", "dirt", "clay"})
 
 
 def _loop_is_acceptable(leg: dict) -> bool:
-    for edge in leg.get("edges", []):
-        if edge.get("road_class", "").lower() in _BAD_CLASSES:
-            return False
-        if edge.get("use", "").lower() in _BAD_USES:
-            return False
-        if edge.get("surface", "").lower() in _BAD_SURFACES:
-            return False
-    return True
+    edges = leg.get("edges")
+    if not edges:
+        return True
+    return not any(
+        edge.get("road_class", "").lower() in _BAD_CLASSES
+        or edge.get("use", "").lower() in _BAD_USES
+        or edge.get("surface", "").lower() in _BAD_SURFACES
+        for edge in edges
+    )
 
 
 # ---------------------------------------------------------------------------
@@ -133,19 +181,16 @@ def _loop_is_acceptable(leg: dict) -> bool:
 def _geometric_midpoints(
     lat0: float, lon0: float, target_km: float, n: int = 5, seed: int = 42
 ) -> list[tuple]:
-    rng = random.Random(seed)
+    rng = np.random.default_rng(seed)
     base_radius = max(0.4, target_km / (2 * math.pi))
-    start_angle = rng.uniform(0, 360)
-    midpoints = []
-    for i in range(n):
-        angle_deg = (start_angle + i * (360 / n) + rng.uniform(-15, 15)) % 360
-        dist_km = rng.uniform(0.75 * base_radius, 1.25 * base_radius)
-        theta = math.radians(angle_deg)
-        d_lat = (dist_km / 111.0) * math.cos(theta)
-        lon_scale = 111.0 * max(0.25, math.cos(math.radians(lat0)))
-        d_lon = (dist_km / lon_scale) * math.sin(theta)
-        midpoints.append((lat0 + d_lat, lon0 + d_lon))
-    return midpoints
+    # Evenly spaced bearings from a random start, each jittered by ±15°
+    bearings = (rng.uniform(0, 360) + np.arange(n) * (360 / n) + rng.uniform(-15, 15, size=n)) % 360
+    dist_km = rng.uniform(0.75 * base_radius, 1.25 * base_radius, size=n)
+    theta = np.radians(bearings)
+    lon_scale = 111.0 * max(0.25, math.cos(math.radians(lat0)))
+    lats = lat0 + (dist_km / 111.0) * np.cos(theta)
+    lons = lon0 + (dist_km / lon_scale) * np.sin(theta)
+    return list(zip(lats.tolist(), lons.tolist()))
 
 
 # ---------------------------------------------------------------------------
@@ -168,34 +213,31 @@ def _poi_seeded_midpoints(
             return []
 
         # Spread POIs around the compass — pick ones in different directions
-        # so the loop actually forms a circuit rather than clustering in one area
-        def bearing_to(poi) -> float:
-            return math.degrees(
-                math.atan2(poi["lon"] - lon0, poi["lat"] - lat0)
-            ) % 360
+        # so the loop actually forms a circuit rather than clustering in one area.
+        # Bearings and distances from the center are computed in one pass each.
+        lats = np.array([p["lat"] for p in pois], dtype=float)
+        lons = np.array([p["lon"] for p in pois], dtype=float)
+        bearings = bearings_many(lat0, lon0, lats, lons)
+        dists_km = haversine_many(lat0, lon0, lats, lons)
 
         # Sort by bearing, then greedily pick POIs at least 60° apart.
-        # Rotate the sorted list by a random offset so each call starts the
+        # Rotate the sorted order by a random offset so each call starts the
         # greedy walk from a different POI — this varies which POIs get selected
         # while still guaranteeing directional spread around the compass.
-        pois_with_bearing = [(p, bearing_to(p)) for p in pois]
-        pois_with_bearing.sort(key=lambda x: x[1])
-        if len(pois_with_bearing) > 1:
-            offset = random.randint(0, len(pois_with_bearing) - 1)
-            pois_with_bearing = pois_with_bearing[offset:] + pois_with_bearing[:offset]
+        order = np.argsort(bearings, kind="stable")
+        order = np.roll(order, -random.randint(0, len(order) - 1))
 
         selected = []
         last_bearing = -999.0
-        for poi, bearing in pois_with_bearing:
-            dist_km = haversine(lat0, lon0, poi["lat"], poi["lon"])
-            if dist_km < 0.15:          # too close to center
+        for i in order.tolist():
+            if dists_km[i] < 0.15:          # too close to center
                 continue
-            if dist_km > target_km:     # too far for the loop
+            if dists_km[i] > target_km:     # too far for the loop
                 continue
-            if abs(bearing - last_bearing) < 60:  # too close in direction
+            if abs(bearings[i] - last_bearing) < 60:  # too close in direction
                 continue
-            selected.append((poi["lat"], poi["lon"]))
-            last_bearing = bearing
+            selected.append((float(lats[i]), float(lons[i])))
+            last_bearing = bearings[i]
             if len(selected) >= n:
                 break
 
@@ -206,76 +248,53 @@ def _poi_seeded_midpoints(
 
 
 # ---------------------------------------------------------------------------
-# Route one loop candidate
+# Assemble one loop candidate from its routed legs
 # ---------------------------------------------------------------------------
-def _route_loop_candidate(
-    center: tuple, midpoints: list, label: str, options: dict
-) -> dict | None:
-    all_coords: list[tuple] = []
-    prev = center
-
-    for mp in midpoints:
-        seg = valhalla_route(prev, mp, "pedestrian", options)
-        if "trip" not in seg:
-            return None
+def _assemble_loop(legs: list[dict], label: str) -> dict | None:
+    """
+    Validate a candidate's Valhalla legs (center → mp1 → … → center) and join them into a loop.
 
-        leg = seg["trip"]["legs"][0]
+    "coordinates" is the joined path, deduplicated in path order. "loop_km" is
+    the sum of the legs' Valhalla summary lengths — the routed walking
+    distance, including any stretch walked out and back — not the length of
+    the deduplicated coordinates.
+    """
+    last = len(legs) - 1
+
+    parts: list[np.ndarray] = []          # (n, 2) lat/lon arrays, one per leg
+    for i, leg in enumerate(legs):
         if not _loop_is_acceptable(leg):
             return None
 
-        coords = [
-            (lat, lon)
-            for lat, lon in polyline.decode(leg["shape"], precision=6)
-            if -90 <= lat <= 90 and -180 <= lon <= 180
-        ]
-        if len(coords) < 2:
+        pts = decode_polyline6(leg["shape"])
+        pts = pts[(np.abs(pts[:, 0]) <= 90) & (np.abs(pts[:, 1]) <= 180)]
+        if i == last:       # return leg: no teleport check
+            parts.append(pts)
+            break
+
+        if len(pts) < 2:
             return None
 
-        for i in range(len(coords) - 1):
-            if haversine(coords[i][0], coords[i][1], coords[i+1][0], coords[i+1][1]) > 0.5:
-                return None
+        if (equirect_path_km(pts[:, 0], pts[:, 1]) > 0.5).any():   # teleport
+            return None
 
-        all_coords.extend(coords)
-        prev = mp
+        parts.append(pts)
 
-    back = valhalla_route(prev, center, "pedestrian", options)
-    if "trip" not in back:
-        return None
+    # Deduplicate on 1e-6° integer keys, keeping first occurrences in path order
+    path = np.concatenate(parts)
+    _, first = np.unique(np.rint(path * 1e6).astype(np.int64), axis=0, return_index=True)
+    path = path[np.sort(first)]
 
-    leg_back = back["trip"]["legs"][0]
-    if not _loop_is_acceptable(leg_back):
+    if len(path) < 30:
         return None
 
-    back_coords = [
-        (lat, lon)
-        for lat, lon in polyline.decode(leg_back["shape"], precision=6)
-        if -90 <= lat <= 90 and -180 <= lon <= 180
-    ]
-    all_coords.extend(back_coords)
-
-    # Deduplicate
-    seen: set = set()
-    clean: list = []
-    for pt in all_coords:
-        key = (round(pt[0], 6), round(pt[1], 6))
-        if key not in seen:
-            seen.add(key)
-            clean.append(pt)
-
-    if len(clean) < 30:
-        return None
-
-    loop_km = sum(
-        haversine(clean[i][0], clean[i][1], clean[i+1][0], clean[i+1][1])
-        for i in range(len(clean) - 1)
-        if haversine(clean[i][0], clean[i][1], clean[i+1][0], clean[i+1][1]) < 0.5
-    )
+    loop_km = float(sum(leg.get("summary", {}).get("length", 0.0) for leg in legs))
 
-    return {"label": label, "coordinates": clean, "loop_km": loop_km}
+    return {"label": label, "coordinates": list(map(tuple, path.tolist())), "loop_km": loop_km}
 
 
 # ---------------------------------------------------------------------------
-# get_ai_loop_route — POI-seeded with geometric fallback, parallel candidates
+# get_ai_loop_route — POI-seeded with geometric fallback, all legs routed in parallel
 # ---------------------------------------------------------------------------
 def get_ai_loop_route(
     center: tuple,
@@ -314,38 +333,37 @@ def get_ai_loop_route(
             (f"geometric_{seed}", _geometric_midpoints(lat0, lon0, target_km, n=n_midpoints, seed=seed))
         )
 
-    def try_candidate(tag_midpoints):
-        tag, midpoints = tag_midpoints
-        result = _route_loop_candidate(center, midpoints, label, options)
-        if result:
-            result["seeded"] = tag.startswith("poi")
-        return result
-
-    candidates = []
-    with ThreadPoolExecutor(max_workers=3) as ex:
-        futures = {ex.submit(try_candidate, item): item for item in candidate_midpoints}
-        for future in as_completed(futures):
-            result = future.result()
-            if result is not None:
-                candidates.append(result)
-
-    if not candidates:
+    # One multi-stop request per candidate (center → midpoints → center);
+    # Valhalla returns one leg per stop, all candidates routed in parallel
+    jobs = [
+        (tag, center, center, "pedestrian", options, midpoints)
+        for tag, midpoints in candidate_midpoints
+    ]
+
+    # Keep only the closest-to-target POI-seeded and geometric loops
+    best_poi = best_geo = None      # (gap to target km, loop)
+    for tag, routed in valhalla_route_many(jobs, max_workers=len(jobs)):
+        if "trip" not in routed:
+            continue
+        result = _assemble_loop(routed["trip"]["legs"], label)
+        if result is None:
+            continue
+        result["seeded"] = tag.startswith("poi")
+        gap = abs(result["loop_km"] - target_km)
+        if result["seeded"]:
+            if best_poi is None or gap < best_poi[0]:
+                best_poi = (gap, result)
+        elif best_geo is None or gap < best_geo[0]:
+            best_geo = (gap, result)
+
+    if best_poi is None and best_geo is None:
         return {"error": "Could not generate a walking loop. Try a different location or distance."}
 
-    # Prefer POI-seeded if it exists and is within 30% of target distance
-    poi_candidates = [c for c in candidates if c.get("seeded")]
-    geo_candidates = [c for c in candidates if not c.get("seeded")]
-
-    if poi_candidates:
-        best_poi = min(poi_candidates, key=lambda c: abs(c["loop_km"] - target_km))
-        best_geo = min(geo_candidates, key=lambda c: abs(c["loop_km"] - target_km)) if geo_candidates else None
-        # Use POI if it's within 40% of target; otherwise take closest geometric
-        if best_geo and abs(best_poi["loop_km"] - target_km) > target_km * 0.4:
-            best = best_geo
-        else:
-            best = best_poi
+    # Use POI if it's within 40% of target; otherwise take closest geometric
+    if best_poi is not None and (best_geo is None or best_poi[0] <= target_km * 0.4):
+        best = best_poi[1]
     else:
-        best = min(candidates, key=lambda c: abs(c["loop_km"] - target_km))
+        best = best_geo[1]
 
     coords = best["coordinates"]
     return {
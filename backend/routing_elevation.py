@@ -4,11 +4,13 @@
 # Uses Valhalla's built-in /height endpoint where available,
 # falling back to the external elevation pipeline.
 
-import requests
-import polyline
+import numpy as np
+import orjson
 from backend.config import VALHALLA_URL, VALHALLA_TIMEOUT
+from backend.elevation import classify_difficulty, compute_gain_loss, compute_slopes
+from backend.utils.http import session as http
 from backend.valhalla_client import valhalla_route
-from backend.utils.common import simplify_waypoints, compute_next_turn, parse_maneuvers
+from backend.utils.common import decode_shape, simplify_waypoints, compute_next_turn, parse_maneuvers
 
 _FLAT_COSTING = {
     "pedestrian": {
@@ -19,60 +21,42 @@ _FLAT_COSTING = {
 }
 
 
-def _fetch_valhalla_heights(coords: list[tuple]) -> list[float] | None:
-    """Ask Valhalla /height for elevation data (no external API needed)."""
+def _fetch_valhalla_heights(shape: str, n_points: int) -> list[float] | None:
+    """
+    Ask Valhalla /height for elevation data (no external API needed).
+
+    The leg's encoded shape is sent as-is, so no per-point payload is built.
+    Valhalla answers with a top-level "height" list, one value per point
+    (null where it has no data).
+    """
     try:
-        payload = {"shape": [{"lat": lat, "lon": lon} for lat, lon in coords]}
-        res = requests.post(
+        payload = {"encoded_polyline": shape, "shape_format": "polyline6"}
+        res = http.post(
             f"{VALHALLA_URL}/height", json=payload, timeout=VALHALLA_TIMEOUT
         )
         if res.status_code != 200:
             return None
-        data = res.json()
-        heights = [pt.get("height", 0) for pt in data.get("shape", [])]
-        return heights if len(heights) == len(coords) else None
+        heights = orjson.loads(res.content).get("height") or []
+        if len(heights) != n_points or any(h is None for h in heights):
+            return None
+        return heights
     except Exception:
         return None
 
 
 def _elevation_stats(coords: list[tuple], elevations: list[float]) -> dict:
-    gain = loss = 0.0
-    slopes = []
-
-    for i in range(1, len(elevations)):
-        diff = elevations[i] - elevations[i - 1]
-        if diff > 0:
-            gain += diff
-        else:
-            loss += abs(diff)
-
-        # approximate horizontal distance (m) between consecutive coords
-        from backend.utils.common import haversine
-        dist_m = haversine(
-            coords[i - 1][0], coords[i - 1][1],
-            coords[i][0], coords[i][1]
-        ) * 1000
-
-        slope = round((diff / dist_m) * 100, 2) if dist_m > 1 else 0.0
-        slopes.append(slope)
-
-    max_slope = max(abs(s) for s in slopes) if slopes else 0.0
-
-    if gain < 40 and max_slope < 5:
-        difficulty = "Easy"
-    elif gain < 120 and max_slope < 10:
-        difficulty = "Moderate"
-    elif gain < 250 and max_slope < 15:
-        difficulty = "Hard"
-    else:
-        difficulty = "Very Hard"
+    # Same vectorized gain/loss, grade and difficulty helpers as the /route
+    # elevation pipeline — one NumPy pass each instead of a per-point loop
+    gain, loss = compute_gain_loss(elevations)
+    slopes = compute_slopes(coords, elevations)
+    max_slope = float(np.abs(slopes).max()) if slopes.size else 0.0
 
     return {
-        "elevations": [round(e, 1) for e in elevations],
+        "elevations": np.round(np.asarray(elevations, dtype=float), 1).tolist(),
         "elevation_gain_m": round(gain, 1),
         "elevation_loss_m": round(loss, 1),
         "max_slope_percent": round(max_slope, 2),
-        "difficulty": difficulty,
+        "difficulty": classify_difficulty(gain, max_slope),
     }
 
 
@@ -84,11 +68,11 @@ def get_elevation_route(start: tuple, end: tuple) -> dict:
 
     leg = result["trip"]["legs"][0]
     summary = result["trip"]["summary"]
-    coords = polyline.decode(leg["shape"], precision=6)
+    coords = decode_shape(leg["shape"])
     steps = parse_maneuvers(leg)
 
     # Try Valhalla's own height service first
-    elevations = _fetch_valhalla_heights(coords)
+    elevations = _fetch_valhalla_heights(leg["shape"], len(coords))
 
     elevation_data: dict = {}
     if elevations:
@@ -1,45 +1,77 @@
 # backend/routing_explore.py
 
-import polyline
+from concurrent.futures import ThreadPoolExecutor
+
 from backend.valhalla_client import valhalla_route
 from backend.utils.common import (
+    decode_shape,
     simplify_waypoints,
     compute_next_turn,
     parse_maneuvers,
     get_weather_and_night,
+    weather_and_night_cached,
 )
 
 
-def get_explore_route(start: tuple, end: tuple) -> dict:
-    lat, lon = start
-    weather, night = get_weather_and_night(lat, lon)
-
-    costing_options = {
-        "pedestrian": {
-            "use_roads": 0.1,
-            "use_tracks": 0.6,
-            "use_hills": 0.4,
-            "use_lit": 0.6,
-            "alley_factor": 1.4,
-            "walkway_factor": 0.5,
-        }
-    }
+_EXPLORE_BASE = {
+    "use_roads": 0.1,
+    "use_tracks": 0.6,
+    "use_hills": 0.4,
+    "use_lit": 0.6,
+    "alley_factor": 1.4,
+    "walkway_factor": 0.5,
+}
+_ROUGH_WEATHER = frozenset({"rain", "snow", "cold"})
 
-    if weather in ("rain", "snow", "cold"):
-        costing_options["pedestrian"]["use_tracks"] = 0.2
 
+def _build_explore_costing(rough_weather: bool, night: bool) -> dict:
+    overrides: dict = {}
+    if rough_weather:
+        overrides["use_tracks"] = 0.2
     if night:
-        costing_options["pedestrian"]["use_tracks"] = 0.0
-        costing_options["pedestrian"]["use_lit"] = 1.2
+        overrides.update(use_tracks=0.0, use_lit=1.2)
+    return {"pedestrian": {**_EXPLORE_BASE, **overrides}}
+
+
+# Every (rough weather, night) variant, built once at import — read-only
+_EXPLORE_COSTINGS: dict[tuple[bool, bool], dict] = {
+    (rough, night): _build_explore_costing(rough, night)
+    for rough in (False, True) for night in (False, True)
+}
+_CLEAR_DAY_COSTING = _EXPLORE_COSTINGS[(False, False)]
+
+
+def _explore_costing(weather: str, night: bool) -> dict:
+    return _EXPLORE_COSTINGS[(weather in _ROUGH_WEATHER, bool(night))]
+
+
+def get_explore_route(start: tuple, end: tuple) -> dict:
+    lat, lon = start
 
-    result = valhalla_route(start, end, costing="pedestrian", costing_options=costing_options)
+    if weather_and_night_cached(lat, lon):
+        weather, night = get_weather_and_night(lat, lon)
+        costing_options = _explore_costing(weather, night)
+        result = valhalla_route(start, end, costing="pedestrian", costing_options=costing_options)
+    else:
+        # Conditions need an upstream round-trip: route the clear-day costing
+        # (the common case) at the same time, and only re-route if they differ
+        with ThreadPoolExecutor(max_workers=1) as ex:
+            speculative = ex.submit(
+                valhalla_route, start, end, "pedestrian", _CLEAR_DAY_COSTING
+            )
+            weather, night = get_weather_and_night(lat, lon)
+            costing_options = _explore_costing(weather, night)
+            if costing_options is _CLEAR_DAY_COSTING:
+                result = speculative.result()
+            else:
+                result = valhalla_route(start, end, costing="pedestrian", costing_options=costing_options)
 
     if "trip" not in result:
         return {"error": result.get("error", "Valhalla failed explore route.")}
 
     leg = result["trip"]["legs"][0]
     summary = result["trip"]["summary"]
-    coords = polyline.decode(leg["shape"], precision=6)
+    coords = decode_shape(leg["shape"])
     steps = parse_maneuvers(leg)
 
     return {
@@ -1,8 +1,8 @@
 # backend/routing_safe.py
 
-import polyline
 from backend.valhalla_client import valhalla_route
 from backend.utils.common import (
+    decode_shape,
     simplify_waypoints,
     compute_next_turn,
     parse_maneuvers,
@@ -41,7 +41,7 @@ def get_safe_route(start: tuple, end: tuple, mode: str = "auto") -> dict:
 
     leg = result["trip"]["legs"][0]
     summary = result["trip"]["summary"]
-    coords = polyline.decode(leg["shape"], precision=6)
+    coords = decode_shape(leg["shape"])
     steps = parse_maneuvers(leg)
 
     return {
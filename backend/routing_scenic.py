@@ -3,9 +3,8 @@
 # Generates up to 3 candidate routes with slight destination nudges,
 # scores them by landuse metadata, returns the most scenic one.
 
-import polyline
 from backend.valhalla_client import valhalla_route_many
-from backend.utils.common import simplify_waypoints, compute_next_turn, parse_maneuvers
+from backend.utils.common import decode_shape, simplify_waypoints, compute_next_turn, parse_maneuvers
 from backend.utils.landuse_scoring import compute_scores_from_valhalla
 
 
@@ -34,15 +33,16 @@ def get_scenic_route(start: tuple, end: tuple) -> dict:
             )
             leg = route_json["trip"]["legs"][0]
             summary = route_json["trip"]["summary"]
-            coords = polyline.decode(leg["shape"], precision=6)
-            scored.append((final_score, label, coords, scores, leg, summary))
+            scored.append((final_score, label, scores, leg, summary))
         except Exception:
             continue
 
     if not scored:
         return {"error": "Scoring failed for all scenic candidates."}
 
-    best_score, best_label, coords, scores, leg, summary = max(scored, key=lambda x: x[0])
+    best_score, best_label, scores, leg, summary = max(scored, key=lambda x: x[0])
+    # Only the winning candidate's shape is decoded
+    coords = decode_shape(leg["shape"])
     steps = parse_maneuvers(leg)
 
     return {
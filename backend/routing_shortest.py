@@ -1,8 +1,7 @@
 # backend/routing_shortest.py
 
-import polyline
 from backend.valhalla_client import valhalla_route
-from backend.utils.common import simplify_waypoints, compute_next_turn, parse_maneuvers
+from backend.utils.common import decode_shape, simplify_waypoints, compute_next_turn, parse_maneuvers
 
 
 def get_shortest_route(start: tuple, end: tuple) -> dict:
@@ -13,7 +12,7 @@ def get_shortest_route(start: tuple, end: tuple) -> dict:
 
     leg = result["trip"]["legs"][0]
     summary = result["trip"]["summary"]
-    coords = polyline.decode(leg["shape"], precision=6)
+    coords = decode_shape(leg["shape"])
     steps = parse_maneuvers(leg)
 
     return {
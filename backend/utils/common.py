@@ -4,9 +4,17 @@
 # Previously copy-pasted 4-5 times — now one canonical place.
 
 import math
-import requests
+import time
+import numpy as np
+import orjson
 from concurrent.futures import ThreadPoolExecutor
-from datetime import datetime, timezone
+from datetime import datetime
+from functools import lru_cache
+
+from backend.cache import (
+    weather_cache, weather_key, WEATHER_FRESH_SECONDS, sun_cache, sun_key,
+)
+from backend.utils.http import session as http
 
 
 # ---------------------------------------------------------------------------
@@ -25,6 +33,190 @@ def haversine(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
     return R * 2 * math.asin(math.sqrt(max(0.0, a)))
 
 
+def make_haversine_from(lat1: float, lon1: float):
+    """
+    Haversine (km) from a fixed origin: returns h(lat2, lon2).
+    The origin's radians and cosine are computed once, not per call.
+    """
+    lat1_r = math.radians(lat1)
+    lon1_r = math.radians(lon1)
+    cos1 = math.cos(lat1_r)
+    radians, sin, cos, asin, sqrt = math.radians, math.sin, math.cos, math.asin, math.sqrt
+
+    def h(lat2: float, lon2: float) -> float:
+        lat2_r = radians(lat2)
+        s_lat = sin((lat2_r - lat1_r) * 0.5)
+        s_lon = sin((radians(lon2) - lon1_r) * 0.5)
+        a = s_lat * s_lat + cos1 * cos(lat2_r) * s_lon * s_lon
+        return 12742.0 * asin(sqrt(min(1.0, a)))   # 2R
+
+    return h
+
+
+def equirect_many(lat: float, lon: float, lats, lons) -> np.ndarray:
+    """
+    Equirectangular (flat-Earth) distance (km) from one point to many.
+    One cos + one sqrt per target, no sin²/asin. Within ~0.1% of haversine
+    up to a few hundred km, which is all ranking heuristics need.
+    """
+    lats = np.asarray(lats, dtype=float)
+    dlat = np.radians(lats - lat)
+    dlon = np.radians((np.asarray(lons, dtype=float) - lon + 180.0) % 360.0 - 180.0)
+    x = dlon * np.cos(np.radians((lats + lat) * 0.5))
+    return 6371.0 * np.sqrt(dlat * dlat + x * x)
+
+
+# Below this many targets the scalar math loop beats NumPy's per-call overhead
+_HAVERSINE_VECTOR_MIN = 8
+
+
+def haversine_many(lat: float, lon: float, lats, lons) -> np.ndarray:
+    """Distance (km) from one point to many, in a single NumPy pass."""
+    if len(lats) < _HAVERSINE_VECTOR_MIN:
+        h = make_haversine_from(lat, lon)
+        return np.array([h(la, lo) for la, lo in zip(lats, lons)], dtype=float)
+
+    lat1 = math.radians(lat)
+    lat2 = np.radians(np.asarray(lats, dtype=float))
+    dlat = lat2 - lat1
+    dlon = np.radians(np.asarray(lons, dtype=float)) - math.radians(lon)
+    a = np.sin(dlat / 2) ** 2 + math.cos(lat1) * np.cos(lat2) * np.sin(dlon / 2) ** 2
+    return 6371.0 * 2 * np.arcsin(np.sqrt(np.clip(a, 0.0, 1.0)))
+
+
+def bearings_many(lat: float, lon: float, lats, lons) -> np.ndarray:
+    """
+    Compass bearing (degrees, 0–360, 0 = north) from one point to many.
+    Same flat approximation as compute_next_turn's fallback, in one arctan2 pass.
+    """
+    dlat = np.asarray(lats, dtype=float) - lat
+    dlon = np.asarray(lons, dtype=float) - lon
+    return np.degrees(np.arctan2(dlon, dlat)) % 360
+
+
+def path_segment_km(lats, lons) -> np.ndarray:
+    """Haversine length (km) of each consecutive segment of a path: N points → N-1 values."""
+    lat = np.radians(np.asarray(lats, dtype=float))
+    lon = np.radians(np.asarray(lons, dtype=float))
+    dlat = np.diff(lat)
+    dlon = np.diff(lon)
+    a = np.sin(dlat / 2) ** 2 + np.cos(lat[:-1]) * np.cos(lat[1:]) * np.sin(dlon / 2) ** 2
+    return 6371.0 * 2 * np.arcsin(np.sqrt(np.clip(a, 0.0, 1.0)))
+
+
+def equirect_path_km(lats, lons) -> np.ndarray:
+    """
+    Equirectangular length (km) of each consecutive path segment: N points → N-1.
+    One cos + one sqrt per segment; within 0.5% of path_segment_km for the
+    sub-kilometre edges of a routed polyline.
+    """
+    lat = np.radians(np.asarray(lats, dtype=float))
+    lon = np.radians(np.asarray(lons, dtype=float))
+    x = np.diff(lon) * np.cos((lat[:-1] + lat[1:]) * 0.5)
+    y = np.diff(lat)
+    return 6371.0 * np.sqrt(x * x + y * y)
+
+
+# ---------------------------------------------------------------------------
+# Polyline decoding (Valhalla shapes use precision 6)
+# ---------------------------------------------------------------------------
+def decode_polyline6(shape: str) -> np.ndarray:
+    """
+    Decode an encoded polyline with precision 6 into an (N, 2) array of (lat, lon).
+
+    Same values as polyline.decode(shape, precision=6), but the varint/zigzag
+    decoding runs as whole-array NumPy ops instead of a per-character loop.
+    """
+    b = np.frombuffer(shape.encode("ascii"), dtype=np.uint8).astype(np.int64) - 63
+    if b.size == 0:
+        return np.empty((0, 2))
+    # Each value is a run of 5-bit chunks; a chunk without the 0x20 bit ends it
+    ends = (b & 0x20) == 0
+    starts = np.flatnonzero(np.concatenate(([True], ends[:-1])))
+    group = np.concatenate(([0], np.cumsum(ends[:-1])))
+    chunks = (b & 0x1F) << (5 * (np.arange(b.size) - starts[group]))
+    values = np.add.reduceat(chunks, starts)        # chunks never overlap: add == or
+    deltas = (values >> 1) ^ -(values & 1)           # zigzag → signed
+    return np.cumsum(deltas.reshape(-1, 2), axis=0) / 1e6
+
+
+def encode_polyline6(coords) -> str:
+    """
+    Encode (lat, lon) points as a precision-6 polyline string.
+
+    Same output as polyline.encode(coords, precision=6), built with whole-array
+    NumPy ops: one delta/zigzag pass, then every 5-bit chunk at once.
+    """
+    pts = np.round(np.asarray(coords, dtype=float).reshape(-1, 2) * 1e6).astype(np.int64)
+    if pts.size == 0:
+        return ""
+    deltas = np.diff(pts, axis=0, prepend=0).ravel()
+    values = np.where(deltas < 0, ~(deltas << 1), deltas << 1)      # signed → zigzag
+    # Chunks per value: 1 + how many 5-bit boundaries it crosses
+    n = 1 + (values[:, None] >= (1 << (5 * np.arange(1, 13)))).sum(axis=1)
+    owner = np.repeat(np.arange(values.size), n)
+    pos = np.arange(owner.size) - np.repeat(np.cumsum(n) - n, n)
+    chunks = (values[owner] >> (5 * pos)) & 0x1F
+    chunks |= np.where(pos < n[owner] - 1, 0x20, 0)                 # continuation bit
+    return (chunks + 63).astype(np.uint8).tobytes().decode("ascii")
+
+
+@lru_cache(maxsize=256)
+def _decoded_shape(shape: str) -> tuple:
+    return tuple(map(tuple, decode_polyline6(shape).tolist()))
+
+
+def decode_shape(shape: str) -> list[tuple]:
+    """
+    Decode a Valhalla leg shape into a list of (lat, lon) tuples.
+
+    Identical shapes recur when a route is refetched (valhalla_cache hands back
+    the same string), so the last 256 decodings are memoized.
+    """
+    return list(_decoded_shape(shape))
+
+
+# ---------------------------------------------------------------------------
+# Polyline simplification (Ramer–Douglas–Peucker) — trims map payloads
+# ---------------------------------------------------------------------------
+def simplify_rdp(coords, epsilon: float = 2e-5) -> np.ndarray:
+    """
+    Ramer–Douglas–Peucker simplification of a (lat, lon) path in degrees.
+
+    Drops every point that lies within epsilon (2e-5° of latitude ≈ 2 m) of
+    the chord it would be replaced by; endpoints are always kept. Longitude is
+    scaled by cos(lat) at the path's mean latitude first, so the tolerance is
+    the same distance in every direction. Each split measures all points of
+    its span in one NumPy pass.
+    """
+    pts = np.asarray(coords, dtype=float).reshape(-1, 2)
+    n = len(pts)
+    if n < 3:
+        return pts
+    xy = pts * (1.0, math.cos(math.radians(pts[:, 0].mean())))
+
+    keep = np.zeros(n, dtype=bool)
+    keep[[0, -1]] = True
+    stack = [(0, n - 1)]
+    while stack:
+        i, j = stack.pop()
+        if j - i < 2:
+            continue
+        a, d = xy[i], xy[j] - xy[i]
+        rel = xy[i + 1:j] - a
+        chord = math.hypot(d[0], d[1])
+        if chord == 0:      # closed span: distance to the shared endpoint
+            dist = np.hypot(rel[:, 0], rel[:, 1])
+        else:
+            dist = np.abs(d[0] * rel[:, 1] - d[1] * rel[:, 0]) / chord
+        k = int(dist.argmax())
+        if dist[k] > epsilon:
+            m = i + 1 + k
+            keep[m] = True
+            stack += [(i, m), (m, j)]
+    return pts[keep]
+
+
 # ---------------------------------------------------------------------------
 # AR waypoint simplification
 # ---------------------------------------------------------------------------
@@ -83,56 +275,120 @@ def parse_maneuvers(leg: dict) -> list[dict]:
 # ---------------------------------------------------------------------------
 # Weather (Open-Meteo) — free, no key required
 # ---------------------------------------------------------------------------
+# WMO weather codes that mean precipitation (rain / showers, snow / snow showers)
+_WEATHER_CODES: dict[int, str] = {
+    **dict.fromkeys((61, 63, 65, 80, 81, 82), "rain"),
+    **dict.fromkeys((71, 73, 75, 77, 85, 86), "snow"),
+}
+
+
+def _classify_weather(code: int, temp: float) -> str:
+    precip = _WEATHER_CODES.get(code)
+    if precip:
+        return precip
+    if temp > 30:
+        return "hot"
+    if temp < 4:
+        return "cold"
+    return "clear"
+
+
 def get_weather(lat: float, lon: float) -> str:
-    """Returns one of: clear | rain | snow | hot | cold"""
+    """
+    Returns one of: clear | rain | snow | hot | cold
+
+    Cached per ~1 km cell for WEATHER_FRESH_SECONDS; if a refresh fails the
+    last known value is returned (stale-if-error) before falling back to "clear".
+    """
+    key = weather_key(lat, lon)
+    entry = weather_cache.get(key)         # (weather, fetched_at)
+    if entry is not None and time.monotonic() - entry[1] < WEATHER_FRESH_SECONDS:
+        return entry[0]
+
     try:
         url = (
             f"https://api.open-meteo.com/v1/forecast"
             f"?latitude={lat}&longitude={lon}&current_weather=true"
         )
-        w = requests.get(url, timeout=4).json()["current_weather"]
-        code = int(w["weathercode"])
-        temp = float(w["temperature"])
-
-        if code in {61, 63, 65, 80, 81, 82}:
-            return "rain"
-        if code in {71, 73, 75, 77, 85, 86}:
-            return "snow"
-        if temp > 30:
-            return "hot"
-        if temp < 4:
-            return "cold"
-        return "clear"
+        w = orjson.loads(http.get(url, timeout=4).content)["current_weather"]
+        weather = _classify_weather(int(w["weathercode"]), float(w["temperature"]))
     except Exception:
-        return "clear"
+        return entry[0] if entry is not None else "clear"
+
+    weather_cache.set(key, (weather, time.monotonic()))
+    return weather
 
 
 # ---------------------------------------------------------------------------
 # Day / Night detection (sunrise-sunset.org)
 # ---------------------------------------------------------------------------
-def is_night(lat: float, lon: float) -> bool:
+def _sun_times(lat: float, lon: float) -> tuple[float, float] | None:
+    """
+    Today's (sunrise, sunset) as epoch seconds, cached per ~1 km cell for the
+    UTC day. If the API fails, yesterday's cached times shifted by a day are
+    close enough (stale-if-error); None when nothing is cached.
+    """
+    key = sun_key(lat, lon)
+    today = int(time.time() // 86400)      # UTC day number
+    entry = sun_cache.get(key)             # (day, sunrise_ts, sunset_ts)
+    if entry is not None and entry[0] == today:
+        return entry[1], entry[2]
+
     try:
-        r = requests.get(
+        r = orjson.loads(http.get(
             f"https://api.sunrise-sunset.org/json?lat={lat}&lng={lon}&formatted=0",
             timeout=4,
-        ).json()["results"]
+        ).content)["results"]
+        sunrise = datetime.fromisoformat(r["sunrise"]).timestamp()
+        sunset = datetime.fromisoformat(r["sunset"]).timestamp()
+    except Exception:
+        if entry is None:
+            return None
+        shift = (today - entry[0]) * 86400
+        return entry[1] + shift, entry[2] + shift
 
-        sunrise = datetime.fromisoformat(r["sunrise"])
-        sunset = datetime.fromisoformat(r["sunset"])
-        now = datetime.now(timezone.utc)
+    sun_cache.set(key, (today, sunrise, sunset))
+    return sunrise, sunset
 
-        return not (sunrise <= now <= sunset)
-    except Exception:
+
+def is_night(lat: float, lon: float) -> bool:
+    times = _sun_times(lat, lon)
+    if times is None:
         # Fallback: night if outside 6am–8pm local
-        hour = datetime.now().hour
+        hour = time.localtime().tm_hour
         return hour < 6 or hour >= 20
 
+    sunrise, sunset = times
+    return not (sunrise <= time.time() <= sunset)
+
 
 # ---------------------------------------------------------------------------
 # Fetch weather + night in parallel (saves ~4s on sequential calls)
 # ---------------------------------------------------------------------------
+def _weather_is_fresh(lat: float, lon: float) -> bool:
+    entry = weather_cache.get(weather_key(lat, lon))
+    return entry is not None and time.monotonic() - entry[1] < WEATHER_FRESH_SECONDS
+
+
+def _sun_is_fresh(lat: float, lon: float) -> bool:
+    entry = sun_cache.get(sun_key(lat, lon))
+    return entry is not None and entry[0] == int(time.time() // 86400)
+
+
+def weather_and_night_cached(lat: float, lon: float) -> bool:
+    """True when get_weather_and_night(lat, lon) can answer without any upstream call."""
+    return _weather_is_fresh(lat, lon) and _sun_is_fresh(lat, lon)
+
+
 def get_weather_and_night(lat: float, lon: float) -> tuple[str, bool]:
-    """Returns (weather, night) fetched concurrently."""
+    """
+    Returns (weather, night). When both need an upstream call they are
+    fetched concurrently; if either is already cached there is at most one
+    round-trip, so both are answered inline without a thread pool.
+    """
+    if _weather_is_fresh(lat, lon) or _sun_is_fresh(lat, lon):
+        return get_weather(lat, lon), is_night(lat, lon)
+
     with ThreadPoolExecutor(max_workers=2) as ex:
         f_weather = ex.submit(get_weather, lat, lon)
         f_night = ex.submit(is_night, lat, lon)
@@ -172,3 +428,29 @@ def point_to_route_distance_m(
         if d < min_dist:
             min_dist = d
     return min_dist
+
+
+def points_to_route_distance_m(
+    lats, lons, coords, sample_every: int = 5
+) -> np.ndarray:
+    """
+    Vectorized point_to_route_distance_m for many points at once: one
+    (points × sampled route) haversine matrix, min over the route axis.
+    """
+    lats = np.asarray(lats, dtype=float)
+    if lats.size == 0:
+        return np.empty(0)
+    route = np.asarray(coords, dtype=float).reshape(-1, 2)
+    if len(route) > sample_every:
+        route = route[::sample_every]
+
+    p_lat = np.radians(lats)[:, None]
+    p_lon = np.radians(np.asarray(lons, dtype=float))[:, None]
+    r_lat = np.radians(route[:, 0])[None, :]
+    r_lon = np.radians(route[:, 1])[None, :]
+
+    a = (np.sin((r_lat - p_lat) * 0.5) ** 2
+         + np.cos(p_lat) * np.cos(r_lat) * np.sin((r_lon - p_lon) * 0.5) ** 2)
+    # min over sin² is monotone with distance → take asin of the min only
+    a_min = np.clip(a.min(axis=1), 0.0, 1.0)
+    return 6371.0 * 2 * np.arcsin(np.sqrt(a_min)) * 1000
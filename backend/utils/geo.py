@@ -1,9 +1,14 @@
 # backend/utils/geo.py
 
-import requests
 import time
+
+import orjson
+import requests
 from fastapi import HTTPException
 
+from backend.cache import reverse_geocode_cache, reverse_geocode_key
+from backend.utils.http import session as http
+
 # Required by Nominatim → avoids IP block
 HEADERS = {
     "User-Agent": "WalkWithMe/1.0 (https://github.com/srijith-reddy)"
@@ -24,7 +29,7 @@ def looks_like_coords(value: str):
         float(parts[0])
         float(parts[1])
         return True
-    except:
+    except ValueError:
         return False
 
 
@@ -42,14 +47,14 @@ def geocode_nominatim(text: str):
 
     for attempt in range(3):
         try:
-            r = requests.get(url, params=params, headers=HEADERS, timeout=5)
+            r = http.get(url, params=params, headers=HEADERS, timeout=5)
 
             # Rate limit / service unavailable (common)
             if r.status_code in (429, 503):
                 time.sleep(1.1)  # Nominatim requires 1 sec delay
                 continue
 
-            data = r.json()
+            data = orjson.loads(r.content)
 
             if data:
                 lat = float(data[0]["lat"])
@@ -72,14 +77,14 @@ def geocode_photon(text: str):
     params = {"q": text.strip()}
 
     try:
-        r = requests.get(url, params=params, timeout=5)
-        data = r.json()
+        r = http.get(url, params=params, timeout=5)
+        data = orjson.loads(r.content)
 
         if "features" in data and len(data["features"]) > 0:
             coords = data["features"][0]["geometry"]["coordinates"]
             lon, lat = coords[0], coords[1]
             return float(lat), float(lon)
-    except:
+    except (requests.RequestException, ValueError, KeyError, IndexError, TypeError):
         pass
 
     raise HTTPException(404, f"No results for '{text}' (Photon fallback failed)")
@@ -96,7 +101,7 @@ def geocode(text: str):
     """
     try:
         return geocode_nominatim(text)
-    except:
+    except HTTPException:
         return geocode_photon(text)
 
 
@@ -104,6 +109,11 @@ def geocode(text: str):
 # Reverse geocode: (lat, lon) → address
 # -------------------------------------------------------------
 def reverse_geocode(lat: float, lon: float):
+    ckey = reverse_geocode_key(lat, lon)
+    cached = reverse_geocode_cache.get(ckey)
+    if cached is not None:
+        return cached
+
     url = "https://nominatim.openstreetmap.org/reverse"
     params = {
         "lat": lat,
@@ -114,10 +124,14 @@ def reverse_geocode(lat: float, lon: float):
     }
 
     try:
-        r = requests.get(url, params=params, headers=HEADERS, timeout=5)
-        data = r.json()
-        return data.get("display_name", "Unknown Location")
-    except:
+        r = http.get(url, params=params, headers=HEADERS, timeout=5)
+        data = orjson.loads(r.content)
+        address = data.get("display_name")
+        if not address:
+            return "Unknown Location"
+        reverse_geocode_cache.set(ckey, address)
+        return address
+    except (requests.RequestException, ValueError, KeyError, AttributeError):
         return "Unknown Location"
 
 
@@ -150,5 +164,5 @@ def parse_location(value: str):
 def parse_location_safe(value: str):
     try:
         return parse_location(value)
-    except:
+    except (HTTPException, ValueError):
         return None
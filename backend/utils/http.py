@@ -0,0 +1,47 @@
+# backend/utils/http.py
+#
+# One process-wide requests.Session for all outbound HTTP.
+# Keep-alive pooling means repeat calls to the same upstream (Photon,
+# Nominatim, Google, OpenTopoData, ...) skip the TCP + TLS handshake.
+# requests.Session is safe to share across the worker threads used here.
+
+import logging
+
+import orjson
+import requests
+from requests.adapters import HTTPAdapter
+
+logger = logging.getLogger("walkwithme.http")
+
+# Per-host pool size — sized for the thread pools that fan out requests
+POOL_MAXSIZE = 32
+
+session = requests.Session()
+_adapter = HTTPAdapter(pool_connections=32, pool_maxsize=POOL_MAXSIZE)
+session.mount("https://", _adapter)
+session.mount("http://", _adapter)
+
+
+def get_json(url: str, **kwargs):
+    """
+    GET url through the shared session and decode the JSON body with orjson.
+
+    Returns None on network errors, non-200 responses, HTML bodies (Google and
+    Nominatim answer quota/ban errors with HTML pages) and malformed JSON —
+    error bodies are never handed to the JSON parser.
+    """
+    try:
+        r = session.get(url, **kwargs)
+    except requests.RequestException as e:
+        logger.warning("GET %s failed: %s", url, e)
+        return None
+    if r.status_code != 200:
+        logger.warning("GET %s returned HTTP %d", url, r.status_code)
+        return None
+    if r.headers.get("content-type", "").startswith("text/html"):
+        return None
+    try:
+        return orjson.loads(r.content)
+    except orjson.JSONDecodeError:
+        logger.warning("GET %s returned invalid JSON", url)
+        return None
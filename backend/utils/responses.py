@@ -0,0 +1,24 @@
+# backend/utils/responses.py
+#
+# JSON response class rendered with orjson.
+# Serializes NumPy arrays and scalars natively, so handlers can keep
+# ndarrays all the way to the wire instead of calling .tolist() per field.
+
+import orjson
+from fastapi.responses import JSONResponse
+
+
+class NumpyJSONResponse(JSONResponse):
+    """
+    orjson-rendered JSONResponse with OPT_SERIALIZE_NUMPY.
+
+    FastAPI runs jsonable_encoder on plain return values, which does not
+    understand ndarrays — handlers whose payload contains arrays must
+    return an instance of this class directly.
+    """
+
+    def render(self, content) -> bytes:
+        return orjson.dumps(
+            content,
+            option=orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS,
+        )
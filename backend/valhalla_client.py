@@ -1,8 +1,11 @@
 # backend/valhalla_client.py
 
+import orjson
 import requests
 from concurrent.futures import ThreadPoolExecutor, as_completed
+from backend.cache import valhalla_cache, valhalla_key
 from backend.config import VALHALLA_URL, VALHALLA_TIMEOUT
+from backend.utils.http import session as http
 
 
 def valhalla_route(
@@ -11,6 +14,7 @@ def valhalla_route(
     costing: str = "pedestrian",
     costing_options: dict | None = None,
     extra_params: dict | None = None,
+    via: list | None = None,
 ) -> dict:
     """
     POST to Valhalla /route.
@@ -19,15 +23,21 @@ def valhalla_route(
     costing: "pedestrian" | "bicycle" | "auto"
     costing_options: Valhalla costing_options dict
     extra_params: merged directly into the request body (e.g. {"directions_options": {...}})
+    via: optional (lat, lon) stops between start and end; each one starts a new
+         entry in trip["legs"], so a multi-leg route costs one request
+
+    Successful responses are cached briefly (valhalla_cache) as the raw JSON
+    bytes, so every hit decodes a fresh dict that callers may annotate or
+    mutate freely; errors are never cached.
     """
-    lat1, lon1 = start
-    lat2, lon2 = end
+    points = [start, *(via or ()), end]
+    ckey = valhalla_key(points, costing, costing_options, extra_params)
+    cached = valhalla_cache.get(ckey)
+    if cached is not None:
+        return orjson.loads(cached)
 
     body: dict = {
-        "locations": [
-            {"lat": lat1, "lon": lon1},
-            {"lat": lat2, "lon": lon2},
-        ],
+        "locations": [{"lat": lat, "lon": lon} for lat, lon in points],
         "costing": costing,
     }
 
@@ -38,13 +48,13 @@ def valhalla_route(
         body.update(extra_params)
 
     try:
-        res = requests.post(
+        res = http.post(
             f"{VALHALLA_URL}/route",
             json=body,
             timeout=VALHALLA_TIMEOUT,
         )
         res.raise_for_status()
-        return res.json()
+        result = orjson.loads(res.content)
     except requests.HTTPError as e:
         return {"error": f"Valhalla HTTP {e.response.status_code}: {e.response.text[:200]}"}
     except requests.Timeout:
@@ -52,6 +62,10 @@ def valhalla_route(
     except Exception as e:
         return {"error": f"Valhalla request failed: {e}"}
 
+    if "trip" in result:
+        valhalla_cache.set(ckey, res.content)
+    return result
+
 
 def valhalla_route_many(
     jobs: list[tuple],
@@ -60,13 +74,17 @@ def valhalla_route_many(
     """
     Run multiple Valhalla route calls in parallel via a thread pool.
 
-    jobs: list of (label, start, end, costing, costing_options) tuples
+    jobs: list of (label, start, end, costing, costing_options[, via]) tuples
     Returns: list of (label, result_dict) in original order
     """
 
     def _call(job):
-        label, start, end, costing, options = job
-        return label, valhalla_route(start, end, costing, options)
+        label, start, end, costing, options, *via = job
+        return label, valhalla_route(start, end, costing, options, via=via[0] if via else None)
+
+    # A single job (e.g. a pruned best-route wave) doesn't need a pool
+    if len(jobs) == 1:
+        return [_call(jobs[0])]
 
     results = [None] * len(jobs)
     with ThreadPoolExecutor(max_workers=min(max_workers, len(jobs))) as ex:
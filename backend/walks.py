@@ -16,7 +16,8 @@
 # endpoints become stateful. The analysis logic stays the same.
 
 import math
-from backend.utils.common import haversine, coords_bbox
+import numpy as np
+from backend.utils.common import haversine, coords_bbox, path_segment_km
 
 
 # ---------------------------------------------------------------------------
@@ -88,10 +89,8 @@ def analyze_coverage(
             continue
         cells = _cells_for_route(route)
         all_walked_cells.update(cells)
-        for i in range(len(route) - 1):
-            total_walked_km += haversine(
-                route[i][0], route[i][1], route[i+1][0], route[i+1][1]
-            )
+        pts = np.asarray(route, dtype=float)
+        total_walked_km += float(path_segment_km(pts[:, 0], pts[:, 1]).sum())
 
     # Derive bounding box
     if city_bbox is None:
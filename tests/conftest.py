@@ -0,0 +1,35 @@
+# tests/conftest.py
+#
+# Shared fixtures. fake_response stands in for a requests.Response from the
+# shared HTTP session, so tests can monkeypatch session.get/post without a
+# network.
+
+import orjson
+import pytest
+import requests
+
+
+class FakeResponse:
+    """Minimal requests.Response: status, headers, raw content, JSON helpers."""
+
+    def __init__(self, payload=None, status_code=200, content=None,
+                 content_type="application/json"):
+        self.status_code = status_code
+        self.content = content if content is not None else orjson.dumps(payload)
+        self.headers = {"content-type": content_type}
+
+    @property
+    def text(self):
+        return self.content.decode("utf-8", "replace")
+
+    def json(self):
+        return orjson.loads(self.content)
+
+    def raise_for_status(self):
+        if self.status_code >= 400:
+            raise requests.HTTPError(response=self)
+
+
+@pytest.fixture
+def fake_response():
+    return FakeResponse
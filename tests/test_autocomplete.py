@@ -0,0 +1,64 @@
+# tests/test_autocomplete.py
+#
+# Unit tests for GET /autocomplete: short queries served from the prefix index
+# and their upstream fallback when the index has nothing yet.
+#
+# No network access — main.get_json is monkeypatched and the endpoint function
+# is called directly.
+
+from unittest import mock
+
+import pytest
+
+from backend import main
+from backend.cache import PrefixIndex, TTLCache
+
+
+PHOTON = {"features": [
+    {"properties": {"name": "Central Park", "city": "New York"},
+     "geometry": {"coordinates": [-73.96, 40.78]}},
+]}
+
+
+class TestShortQueries:
+
+    @pytest.fixture(autouse=True)
+    def fresh_state(self, monkeypatch):
+        monkeypatch.setattr(main, "autocomplete_prefix_index", PrefixIndex())
+        monkeypatch.setattr(main, "autocomplete_cache", TTLCache(ttl_seconds=60))
+        monkeypatch.setattr(main, "provider_cache", TTLCache(ttl_seconds=60))
+        monkeypatch.setattr(main, "ip_bias_cache", TTLCache(ttl_seconds=60))
+        self.urls = []
+
+        def fake_get_json(url, params=None, headers=None, timeout=None):
+            self.urls.append(url)
+            if "photon" in url:
+                return PHOTON
+            if "ipapi" in url:
+                return {"latitude": 40.75, "longitude": -73.98}
+            return []
+        monkeypatch.setattr(main, "get_json", fake_get_json)
+
+    def _request(self, ip="203.0.113.7"):
+        return mock.Mock(headers={"x-forwarded-for": ip})
+
+    def _autocomplete(self, q, **kw):
+        return main.autocomplete(request=self._request(), q=q,
+                                 user_lat=kw.get("user_lat"), user_lon=kw.get("user_lon"), limit=7)
+
+    def test_cold_index_falls_back_to_upstream(self):
+        results = self._autocomplete("ce")
+        assert [r["label"] for r in results] == ["Central Park, New York"]
+        assert any("photon" in u for u in self.urls)
+
+    def test_warm_index_answers_without_upstream(self):
+        self._autocomplete("central", user_lat=40.75, user_lon=-73.98)
+        self.urls.clear()
+        results = self._autocomplete("ce", user_lat=40.75, user_lon=-73.98)
+        assert [r["label"] for r in results] == ["Central Park, New York"]
+        assert self.urls == []
+
+    def test_uncached_ip_matches_unbiased_records(self):
+        main.autocomplete_prefix_index.record("central", None, [{"label": "Central"}])
+        assert self._autocomplete("ce") == [{"label": "Central"}]
+        assert self.urls == []      # no ipapi call either
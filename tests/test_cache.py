@@ -0,0 +1,143 @@
+# tests/test_cache.py
+#
+# Unit tests for the in-memory TTL cache, prefix index, request collapsing
+# and the cache key helpers.
+
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from backend import cache
+from backend.cache import PrefixIndex, SingleFlight, TTLCache, provider_key, vision_key
+
+
+class TestTTLCache:
+
+    def test_per_entry_ttl_override(self, monkeypatch):
+        now = [1000.0]
+        monkeypatch.setattr(cache.time, "monotonic", lambda: now[0])
+        c = TTLCache(ttl_seconds=300)
+        c.set("long", 1)
+        c.set("short", 2, ttl=60)
+        now[0] += 61
+        assert c.get("long") == 1
+        assert c.get("short") is None
+
+    def test_empty_list_is_a_hit(self):
+        c = TTLCache()
+        c.set("k", [])
+        assert c.get("k") == []
+
+
+class TestProviderKey:
+
+    def test_normalizes_query_and_buckets_location(self):
+        a = provider_key("photon", "  Central   Park ", 40.7812, -73.9665, 7)
+        b = provider_key("photon", "central park", 40.7849, -73.9711, 7)
+        assert a == b
+
+    def test_provider_and_limit_distinguish(self):
+        base = provider_key("photon", "cafe", None, None, 7)
+        assert base != provider_key("nominatim", "cafe", None, None, 7)
+        assert base != provider_key("photon", "cafe", None, None, 5)
+
+
+class TestVisionKey:
+
+    def test_order_and_small_jitter_share_a_key(self):
+        a = vision_key([{"label": "car", "conf": 0.91}, {"label": "person", "conf": 0.62}], 92.0, 41.0)
+        b = vision_key([{"label": "person", "conf": 0.58}, {"label": "car", "conf": 0.89}], 95.0, 39.0)
+        assert a == b
+
+    def test_new_detection_changes_key(self):
+        base = vision_key(["person"], 90.0, 40.0)
+        assert base != vision_key(["person", "bicycle"], 90.0, 40.0)
+
+    def test_missing_heading_and_distance(self):
+        assert vision_key([], None, None) == vision_key([], None, None)
+
+
+class TestPrefixIndex:
+
+    def test_most_popular_completion_wins(self):
+        idx = PrefixIndex()
+        idx.record("Central Park", (41, -74), [{"label": "Central Park"}])
+        idx.record("Chelsea Market", (41, -74), [{"label": "Chelsea Market"}])
+        idx.record("chelsea market", (41, -74), [{"label": "Chelsea Market"}])
+        assert idx.lookup("c", (41, -74), 5) == [{"label": "Chelsea Market"}]
+        assert idx.lookup("Ce", (41, -74), 5) == [{"label": "Central Park"}]
+
+    def test_regions_are_separate(self):
+        idx = PrefixIndex()
+        idx.record("camden", (52, 0), [{"label": "Camden"}])
+        assert idx.lookup("ca", (41, -74), 5) == []
+
+    def test_evicts_least_popular(self):
+        idx = PrefixIndex(max_entries=2)
+        idx.record("aa", None, ["a"])
+        idx.record("aa", None, ["a"])
+        idx.record("ab", None, ["b"])
+        idx.record("ac", None, ["c"])
+        assert idx.lookup("ab", None, 5) == []
+        assert idx.lookup("a", None, 5) == ["a"]
+
+    def test_evicting_the_best_promotes_the_next(self):
+        idx = PrefixIndex(max_entries=2)
+        idx.record("ba", None, ["ba"])
+        idx.record("bb", None, ["bb"])
+        idx.record("bb", None, ["bb"])
+        idx.record("ca", None, ["ca"])        # evicts "ba" (least popular)
+        assert idx.lookup("b", None, 5) == ["bb"]
+        idx.record("ca", None, ["ca"])
+        idx.record("ca", None, ["ca"])
+        idx.record("da", None, ["da"])        # evicts "bb"; nothing left under "b"
+        assert idx.lookup("b", None, 5) == []
+        assert idx.lookup("", None, 5) == ["ca"]
+
+    def test_prefix_longer_than_index(self):
+        idx = PrefixIndex(max_prefix_len=1)
+        idx.record("cafe", None, ["cafe"])
+        idx.record("cake", None, ["cake"])
+        idx.record("cake", None, ["cake"])
+        assert idx.lookup("caf", None, 5) == ["cafe"]
+        assert idx.lookup("ca", None, 5) == ["cake"]
+        assert idx.lookup("cx", None, 5) == []
+
+
+class TestSingleFlight:
+
+    def test_concurrent_calls_share_one_fetch(self):
+        sf = SingleFlight()
+        entered = threading.Semaphore(0)
+        release = threading.Event()
+        calls = []
+
+        def fetch():
+            calls.append(1)
+            release.wait(2)
+            return ["result"]
+
+        def call():
+            entered.release()
+            return sf.do("k", fetch)
+
+        with ThreadPoolExecutor(max_workers=4) as ex:
+            futures = [ex.submit(call) for _ in range(4)]
+            for _ in range(4):
+                entered.acquire()
+            time.sleep(0.05)     # let every caller reach do() while the first is in flight
+            release.set()
+            results = [f.result() for f in futures]
+
+        assert results == [["result"]] * 4
+        assert len(calls) == 1
+        assert len(sf) == 0
+
+    def test_exception_reaches_caller_and_clears_key(self):
+        sf = SingleFlight()
+        with pytest.raises(ValueError):
+            sf.do("k", lambda: (_ for _ in ()).throw(ValueError("boom")))
+        assert sf.do("k", lambda: 42) == 42
+        assert len(sf) == 0
@@ -0,0 +1,281 @@
+# tests/test_common.py
+#
+# Unit tests for the shared geo and weather helpers in backend/utils/common.py.
+#
+# No network access — the shared HTTP session is monkeypatched where a helper
+# would call out.
+
+import time
+from datetime import datetime, timedelta, timezone
+
+import polyline
+import pytest
+import requests
+
+from backend.cache import TTLCache
+from backend.utils import common
+from backend.utils.common import (
+    bearings_many, decode_polyline6, decode_shape, encode_polyline6, equirect_many, equirect_path_km, haversine, haversine_many, make_haversine_from,
+    path_segment_km, point_to_route_distance_m, points_to_route_distance_m, simplify_rdp,
+)
+
+
+# ===========================================================================
+# Haversine
+# ===========================================================================
+
+class TestHaversineMany:
+
+    def test_matches_scalar_haversine(self):
+        lats = [40.7128, 40.7580, 34.0522, -33.8688, 40.7128]
+        lons = [-74.0060, -73.9855, -118.2437, 151.2093, -74.0060]
+        expected = [haversine(40.7128, -74.0060, la, lo) for la, lo in zip(lats, lons)]
+        assert haversine_many(40.7128, -74.0060, lats, lons).tolist() == pytest.approx(expected)
+
+    def test_vector_path_matches_scalar(self):
+        lats = [40.0 + i * 0.01 for i in range(20)]
+        lons = [-74.0 - i * 0.02 for i in range(20)]
+        expected = [haversine(40.5, -74.1, la, lo) for la, lo in zip(lats, lons)]
+        assert haversine_many(40.5, -74.1, lats, lons).tolist() == pytest.approx(expected)
+
+    def test_empty(self):
+        assert haversine_many(0.0, 0.0, [], []).size == 0
+
+
+class TestMakeHaversineFrom:
+
+    def test_matches_haversine(self):
+        h = make_haversine_from(51.5074, -0.1278)
+        for lat, lon in [(48.8566, 2.3522), (51.5074, -0.1278), (-33.9, 151.2)]:
+            assert h(lat, lon) == pytest.approx(haversine(51.5074, -0.1278, lat, lon))
+
+
+class TestEquirectMany:
+
+    def test_close_to_haversine_at_city_scale(self):
+        lats = [40.75, 40.80, 41.10, 40.30]
+        lons = [-73.99, -73.90, -74.20, -74.50]
+        exact = haversine_many(40.7128, -74.0060, lats, lons)
+        approx = equirect_many(40.7128, -74.0060, lats, lons)
+        assert approx.tolist() == pytest.approx(exact.tolist(), rel=1e-3)
+
+    def test_wraps_antimeridian(self):
+        d = equirect_many(0.0, 179.9, [0.0], [-179.9])[0]
+        assert d == pytest.approx(haversine(0.0, 179.9, 0.0, -179.9), rel=1e-3)
+
+
+# ===========================================================================
+# Point-to-route distance
+# ===========================================================================
+
+class TestPointsToRouteDistance:
+
+    def test_matches_scalar_version(self):
+        route = [(40.70 + i * 0.001, -74.00 + i * 0.0005) for i in range(40)]
+        pts = [(40.705, -73.998), (40.73, -73.98), (40.70, -74.01)]
+        got = points_to_route_distance_m([p[0] for p in pts], [p[1] for p in pts], route, 4)
+        expected = [point_to_route_distance_m(la, lo, route, 4) for la, lo in pts]
+        assert got.tolist() == pytest.approx(expected)
+
+    def test_no_points(self):
+        assert points_to_route_distance_m([], [], [(0.0, 0.0)]).size == 0
+
+
+class TestBearingsMany:
+
+    def test_compass_quadrants(self):
+        lats = [41.0, 40.0, 39.0, 40.0]
+        lons = [-74.0, -73.0, -74.0, -75.0]
+        assert bearings_many(40.0, -74.0, lats, lons).tolist() == [0.0, 90.0, 180.0, 270.0]
+
+    def test_matches_next_turn_formula(self):
+        lat, lon = 40.7, -74.0
+        bearing = bearings_many(lat, lon, [40.7012], [-73.9991])[0]
+        expected = common.compute_next_turn([], [(lat, lon), (40.7012, -73.9991)])["degrees"]
+        assert round(bearing, 1) == expected % 360
+
+
+class TestPathSegmentKm:
+
+    def test_matches_scalar_haversine_per_segment(self):
+        lats = [40.7128, 40.7580, 40.7306, -33.8688]
+        lons = [-74.0060, -73.9855, -73.9352, 151.2093]
+        expected = [haversine(lats[i], lons[i], lats[i + 1], lons[i + 1]) for i in range(3)]
+        assert path_segment_km(lats, lons).tolist() == pytest.approx(expected, rel=1e-9)
+
+    def test_single_point_has_no_segments(self):
+        assert path_segment_km([40.7], [-74.0]).size == 0
+
+    def test_equirect_close_on_short_edges(self):
+        lats = [40.7000 + i * 0.0003 for i in range(50)]
+        lons = [-74.0000 + (i % 3) * 0.0004 for i in range(50)]
+        assert equirect_path_km(lats, lons).tolist() == pytest.approx(
+            path_segment_km(lats, lons).tolist(), rel=5e-3)
+
+
+# ===========================================================================
+# Polyline decoding
+# ===========================================================================
+
+class TestDecodePolyline6:
+
+    def test_matches_polyline_package(self):
+        pts = [(40.712776, -74.005974), (40.7128, -74.0059), (-33.868820, 151.209296),
+               (0.0, 0.0), (89.999999, -179.999999), (-12.5, 45.000001)]
+        shape = polyline.encode(pts, precision=6)
+        assert decode_polyline6(shape).tolist() == [list(p) for p in polyline.decode(shape, precision=6)]
+
+    def test_empty_shape(self):
+        assert decode_polyline6("").shape == (0, 2)
+
+
+class TestEncodePolyline6:
+
+    def test_matches_polyline_package(self):
+        pts = [(40.712776, -74.005974), (40.7128, -74.0059), (-33.868820, 151.209296),
+               (0.0, 0.0), (89.999999, -179.999999), (-12.5, 45.000001)]
+        assert encode_polyline6(pts) == polyline.encode(pts, precision=6)
+
+    def test_round_trips_through_decode(self):
+        pts = [(40.7 + i * 1e-4, -74.0 - i * 3e-4) for i in range(20)]
+        assert decode_polyline6(encode_polyline6(pts)).ravel().tolist() == pytest.approx([v for p in pts for v in p])
+
+    def test_empty_path(self):
+        assert encode_polyline6([]) == ""
+
+
+class TestDecodeShape:
+
+    def test_returns_fresh_list_of_tuples(self):
+        shape = polyline.encode([(40.7, -74.0), (40.71, -74.01)], precision=6)
+        first = decode_shape(shape)
+        assert first == polyline.decode(shape, precision=6)
+        first.append((0.0, 0.0))            # callers may mutate their copy
+        assert decode_shape(shape) == polyline.decode(shape, precision=6)
+
+
+class TestSimplifyRdp:
+
+    def test_drops_collinear_points(self):
+        line = [(40.7 + i * 1e-4, -74.0 + i * 1e-4) for i in range(50)]
+        assert simplify_rdp(line).tolist() == [list(line[0]), list(line[-1])]
+
+    def test_keeps_corner_beyond_epsilon(self):
+        path = [(0.0, 0.0), (0.0, 0.001), (0.0, 0.002), (0.001, 0.002), (0.002, 0.002)]
+        assert simplify_rdp(path).tolist() == [[0.0, 0.0], [0.0, 0.002], [0.002, 0.002]]
+
+    def test_drops_jitter_within_epsilon(self):
+        path = [(0.0, 0.0), (1e-5, 0.001), (0.0, 0.002)]
+        assert len(simplify_rdp(path)) == 2
+
+    def test_longitude_tolerance_scales_with_latitude(self):
+        # 3e-5° of longitude is ~1.7 m at 60°N — inside the ~2 m tolerance
+        path = [(60.0, 0.0), (60.001, 3e-5), (60.002, 0.0)]
+        assert len(simplify_rdp(path)) == 2
+        # ...but ~3.3 m at the equator
+        assert len(simplify_rdp([(0.0, 0.0), (0.001, 3e-5), (0.002, 0.0)])) == 3
+
+    def test_closed_loop_keeps_its_shape(self):
+        loop = [(0.0, 0.0), (0.001, 0.0), (0.001, 0.001), (0.0, 0.001), (0.0, 0.0)]
+        assert simplify_rdp(loop).tolist() == [list(p) for p in loop]
+
+    def test_short_paths_unchanged(self):
+        assert simplify_rdp([(1.0, 2.0), (3.0, 4.0)]).tolist() == [[1.0, 2.0], [3.0, 4.0]]
+        assert simplify_rdp([]).shape == (0, 2)
+
+
+# ===========================================================================
+# Weather / night caching
+# ===========================================================================
+
+class TestWeatherCache:
+
+    @pytest.fixture(autouse=True)
+    def fresh_cache(self, monkeypatch, fake_response):
+        self.fake_response = fake_response
+        self.now = [1000.0]
+        monkeypatch.setattr(common, "weather_cache", TTLCache(ttl_seconds=21600))
+        monkeypatch.setattr(common.time, "monotonic", lambda: self.now[0])
+
+    def _serve(self, monkeypatch, calls, code=61, temp=12.0, fail=False):
+        def fake_get(url, timeout=None):
+            calls.append(url)
+            if fail:
+                raise requests.ConnectionError("down")
+            return self.fake_response({"current_weather": {"weathercode": code, "temperature": temp}})
+        monkeypatch.setattr(common.http, "get", fake_get)
+
+    def test_nearby_points_share_one_fetch(self, monkeypatch):
+        calls = []
+        self._serve(monkeypatch, calls)
+        assert common.get_weather(40.7128, -74.0060) == "rain"
+        assert common.get_weather(40.7131, -74.0058) == "rain"
+        assert len(calls) == 1
+
+    def test_stale_value_served_when_refresh_fails(self, monkeypatch):
+        calls = []
+        self._serve(monkeypatch, calls, code=0, temp=35.0)
+        assert common.get_weather(40.7, -74.0) == "hot"
+
+        self.now[0] += common.WEATHER_FRESH_SECONDS + 1
+        self._serve(monkeypatch, calls, fail=True)
+        assert common.get_weather(40.7, -74.0) == "hot"
+        assert len(calls) == 2
+
+    def test_no_cache_and_failure_falls_back_to_clear(self, monkeypatch):
+        self._serve(monkeypatch, [], fail=True)
+        assert common.get_weather(40.7, -74.0) == "clear"
+
+
+class TestIsNight:
+
+    @pytest.fixture(autouse=True)
+    def fresh_cache(self, monkeypatch):
+        monkeypatch.setattr(common, "sun_cache", TTLCache(ttl_seconds=172800))
+
+    def test_sun_times_cached_for_the_day(self, monkeypatch, fake_response):
+        now = datetime.now(timezone.utc)
+        calls = []
+
+        def fake_get(url, timeout=None):
+            calls.append(url)
+            return fake_response({"results": {
+                "sunrise": (now - timedelta(hours=1)).isoformat(),
+                "sunset": (now + timedelta(hours=1)).isoformat(),
+            }})
+
+        monkeypatch.setattr(common.http, "get", fake_get)
+        assert common.is_night(40.7, -74.0) is False
+        assert common.is_night(40.7, -74.0) is False
+        assert len(calls) == 1
+
+    def test_yesterdays_times_shifted_when_api_fails(self, monkeypatch):
+        now = time.time()
+        yesterday = int(now // 86400) - 1
+        common.sun_cache.set(common.sun_key(40.7, -74.0), (
+            yesterday,
+            now - 86400 - 3 * 3600,
+            now - 86400 - 2 * 3600,
+        ))
+
+        def down(url, timeout=None):
+            raise requests.ConnectionError("down")
+
+        monkeypatch.setattr(common.http, "get", down)
+        assert common.is_night(40.7, -74.0) is True   # shifted sunset was 2 h ago
+
+
+class TestGetWeatherAndNight:
+
+    @pytest.fixture(autouse=True)
+    def fresh_caches(self, monkeypatch):
+        monkeypatch.setattr(common, "weather_cache", TTLCache(ttl_seconds=21600))
+        monkeypatch.setattr(common, "sun_cache", TTLCache(ttl_seconds=172800))
+
+    def test_cached_values_skip_the_thread_pool(self, monkeypatch):
+        now = time.time()
+        common.weather_cache.set(common.weather_key(40.7, -74.0), ("snow", time.monotonic()))
+        common.sun_cache.set(common.sun_key(40.7, -74.0), (int(now // 86400), now - 60, now + 60))
+        monkeypatch.setattr(common, "ThreadPoolExecutor", lambda **kw: pytest.fail("pool used"))
+        monkeypatch.setattr(common.http, "get", lambda *a, **kw: pytest.fail("upstream hit"))
+        assert common.get_weather_and_night(40.7, -74.0) == ("snow", False)
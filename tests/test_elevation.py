@@ -0,0 +1,375 @@
+# tests/test_elevation.py
+#
+# Unit tests for the elevation analytics helpers.
+#
+# All tests are pure-logic — no elevation API calls are made.
+
+import math
+import numpy as np
+import pytest
+
+from backend import elevation, routing_elevation
+from backend.elevation import compute_gain_loss, compute_slopes, smooth_elevation
+
+
+def _scalar_slopes(coords, elev):
+    """Reference implementation: one haversine per segment."""
+    out = []
+    for i in range(1, len(coords)):
+        lat1, lon1 = map(math.radians, coords[i - 1])
+        lat2, lon2 = map(math.radians, coords[i])
+        a = (math.sin((lat2 - lat1) / 2) ** 2
+             + math.cos(lat1) * math.cos(lat2) * math.sin((lon2 - lon1) / 2) ** 2)
+        dist = 2 * 6371000 * math.asin(math.sqrt(a))
+        out.append(0 if dist < 1 else round((elev[i] - elev[i - 1]) / dist * 100, 3))
+    return out
+
+
+# ===========================================================================
+# Slopes
+# ===========================================================================
+
+class TestComputeSlopes:
+
+    def test_matches_scalar_reference(self):
+        coords = [(40.7000 + i * 0.0005, -74.0000 + i * 0.0003) for i in range(50)]
+        elev = [10 + (i % 7) * 1.5 for i in range(50)]
+        assert compute_slopes(coords, elev).tolist() == pytest.approx(_scalar_slopes(coords, elev))
+
+    def test_short_segment_is_flat(self):
+        coords = [(40.7, -74.0), (40.7, -74.0), (40.701, -74.0)]
+        slopes = compute_slopes(coords, [0, 5, 10])
+        assert slopes[0] == 0
+
+    def test_uphill_is_positive(self):
+        coords = [(40.7, -74.0), (40.701, -74.0)]   # ~111 m north
+        slopes = compute_slopes(coords, [0, 11.1])
+        assert slopes[0] == pytest.approx(10.0, abs=0.1)
+
+    def test_precomputed_radians_match(self):
+        coords = [(51.5 + i * 0.0004, -0.12 - i * 0.0002) for i in range(20)]
+        elev = [float(i % 5) for i in range(20)]
+        np.testing.assert_array_equal(
+            compute_slopes(coords, elev, rad=elevation.to_radians(coords)),
+            compute_slopes(coords, elev),
+        )
+
+    def test_single_point_has_no_slopes(self):
+        assert compute_slopes([(40.7, -74.0)], [3.0]).size == 0
+
+
+# ===========================================================================
+# Smoothing
+# ===========================================================================
+
+class TestSmoothElevation:
+
+    def test_matches_same_mode_convolution(self):
+        elev = np.arange(20, dtype=float) ** 1.5
+        expected = np.convolve(elev, np.array([1, 2, 4, 2, 1]) / 10, mode="same")
+        np.testing.assert_allclose(smooth_elevation(elev), expected)
+
+    def test_preserves_length_of_short_profiles(self):
+        for n in range(0, 6):
+            assert len(smooth_elevation([10.0] * n)) == n
+
+
+# ===========================================================================
+# Gain / loss
+# ===========================================================================
+
+class TestComputeGainLoss:
+
+    def test_mixed_profile(self):
+        assert compute_gain_loss([10, 12, 11, 15, 15, 9]) == (6.0, 7.0)
+
+    def test_accepts_ndarray(self):
+        assert compute_gain_loss(np.array([0.0, 1.25, 0.5])) == (1.25, 0.75)
+
+    def test_flat_or_empty(self):
+        assert compute_gain_loss([5, 5, 5]) == (0.0, 0.0)
+        assert compute_gain_loss([]) == (0.0, 0.0)
+
+
+# ===========================================================================
+# Cache keys
+# ===========================================================================
+
+class TestCacheKey:
+
+    def test_rounds_to_five_decimals(self):
+        assert elevation.cache_key(40.712341, -74.005671) == elevation.cache_key(40.71234, -74.00567)
+        assert elevation.cache_key(40.71234, -74.00567) != elevation.cache_key(40.71235, -74.00567)
+
+    def test_signs_do_not_collide(self):
+        keys = {elevation.cache_key(la, lo) for la in (-33.9, 33.9) for lo in (-151.2, 151.2)}
+        assert len(keys) == 4
+        assert all(-2 ** 63 <= k < 2 ** 63 for k in keys)
+
+    def test_vectorized_keys_match_scalar(self):
+        coords = [(40.712345, -74.005675), (-33.86882, 151.20929), (0.000005, -0.000015)]
+        assert elevation.cache_keys(coords).tolist() == [elevation.cache_key(*c) for c in coords]
+
+
+# ===========================================================================
+# In-memory store
+# ===========================================================================
+
+class TestElevationStore:
+
+    def test_hits_before_and_after_merge(self, monkeypatch):
+        monkeypatch.setattr(elevation._ElevationStore, "MERGE_AT", 3)
+        store = elevation._ElevationStore()
+        store.put_many(np.array([30, 10]), [3.0, 1.0])        # pending only
+        vals, hit = store.get_many(np.array([10, 20, 30]))
+        assert hit.tolist() == [True, False, True]
+        assert vals[[0, 2]].tolist() == [1.0, 3.0]
+
+        store.put_many(np.array([20, -5]), [2.0, -0.5])       # triggers merge
+        vals, hit = store.get_many(np.array([-5, 10, 20, 30, 40]))
+        assert hit.tolist() == [True, True, True, True, False]
+        assert vals[:4].tolist() == [-0.5, 1.0, 2.0, 3.0]
+        assert len(store) == 4
+
+    def test_value_unchanged_by_merge(self, monkeypatch):
+        monkeypatch.setattr(elevation._ElevationStore, "MERGE_AT", 2)
+        store = elevation._ElevationStore()
+        store.put_many(np.array([1]), [123.456])
+        before = store.get_many(np.array([1]))[0].tolist()
+        store.put_many(np.array([2]), [0.0])                  # triggers merge
+        assert store._keys.size == 2
+        assert store.get_many(np.array([1]))[0].tolist() == before == [123.456]
+
+    def test_clear_keeps_the_lock(self):
+        store = elevation._ElevationStore()
+        lock = store._lock
+        store.put_many(np.array([1, 2]), [1.0, 2.0])
+        store.clear()
+        assert store._lock is lock
+        assert len(store) == 0
+        assert not store.get_many(np.array([1, 2]))[1].any()
+
+    def test_first_write_wins(self):
+        store = elevation._ElevationStore()
+        store.put_many(np.array([7]), [70.0])
+        store.put_many(np.array([7]), [0.0])
+        assert store.get_many(np.array([7]))[0].tolist() == [70.0]
+
+
+# ===========================================================================
+# Persistent cache tier
+# ===========================================================================
+
+class TestPersistentCache:
+
+    @pytest.fixture
+    def db_path(self, tmp_path, monkeypatch):
+        monkeypatch.setattr(elevation, "ELEVATION_CACHE_PATH", str(tmp_path / "elev.db"))
+        monkeypatch.setattr(elevation, "_db", None)
+        monkeypatch.setattr(elevation, "ELEV_CACHE", elevation._ElevationStore())
+        yield
+        if elevation._db is not None:
+            elevation._db.close()
+
+    def test_survives_hot_tier_loss(self, db_path, monkeypatch):
+        keys = elevation.cache_keys([(40.7, -74.0), (1.0, 1.0)])
+        elevation._cache_put_many(keys[:1], [12.5])
+        monkeypatch.setattr(elevation, "ELEV_CACHE", elevation._ElevationStore())
+        vals, hit = elevation._cache_get_many(keys)
+        assert hit.tolist() == [True, False]
+        assert vals[0] == 12.5
+        assert elevation.ELEV_CACHE.get_many(keys[:1])[1].all()   # promoted
+
+    def test_southern_western_key_round_trips(self, db_path, monkeypatch):
+        keys = elevation.cache_keys([(-33.9, -70.6)])
+        elevation._cache_put_many(keys, [540.0])
+        monkeypatch.setattr(elevation, "ELEV_CACHE", elevation._ElevationStore())
+        assert elevation._cache_get_many(keys)[0].tolist() == [540.0]
+
+    def test_unpersisted_entries_stay_in_process(self, db_path, monkeypatch):
+        keys = elevation.cache_keys([(40.7, -74.0)])
+        elevation._cache_put_many(keys, [0.0], persist=False)
+        monkeypatch.setattr(elevation, "ELEV_CACHE", elevation._ElevationStore())
+        assert not elevation._cache_get_many(keys)[1].any()
+
+    def test_db_errors_are_logged(self, db_path, monkeypatch, caplog):
+        keys = elevation.cache_keys([(40.7, -74.0)])
+        elevation._cache_put_many(keys, [1.0])
+        elevation._db.close()                  # every later query raises
+        monkeypatch.setattr(elevation, "ELEV_CACHE", elevation._ElevationStore())
+        monkeypatch.setattr(elevation, "_db", elevation._db)
+        with caplog.at_level("WARNING", logger="backend.elevation"):
+            elevation._cache_put_many(keys, [1.0])
+            assert not elevation._cache_get_many(elevation.cache_keys([(1.0, 1.0)]))[1].any()
+        messages = [r.getMessage() for r in caplog.records]
+        assert "elevation cache write failed" in messages
+        assert "elevation cache read failed" in messages
+
+    def test_unopenable_db_logs_a_warning(self, monkeypatch, tmp_path, caplog):
+        monkeypatch.setattr(elevation, "ELEVATION_CACHE_PATH", str(tmp_path / "missing" / "elev.db"))
+        monkeypatch.setattr(elevation, "_db", None)
+        with caplog.at_level("WARNING", logger="backend.elevation"):
+            assert elevation._get_db() is None
+        assert any("cache db disabled" in r.getMessage() for r in caplog.records)
+
+    def test_fetch_batch_served_from_disk(self, db_path, monkeypatch):
+        coords = [(40.7, -74.0), (40.701, -74.0)]
+        monkeypatch.setattr(elevation, "fetch_opentopo", lambda c: [1.0, 2.0])
+        assert elevation.fetch_batch(coords).tolist() == [1.0, 2.0]
+
+        monkeypatch.setattr(elevation, "ELEV_CACHE", elevation._ElevationStore())
+        monkeypatch.setattr(elevation, "fetch_opentopo", lambda c: pytest.fail("upstream hit"))
+        assert elevation.fetch_batch(coords).tolist() == [1.0, 2.0]
+
+
+# ===========================================================================
+# OpenTopoData
+# ===========================================================================
+
+class TestFetchOpentopo:
+
+    @pytest.fixture(autouse=True)
+    def no_sleep(self, monkeypatch):
+        self.sleeps = []
+        monkeypatch.setattr(elevation.time, "sleep", self.sleeps.append)
+
+    def test_long_routes_are_chunked_up_front(self, monkeypatch, fake_response):
+        sizes = []
+
+        def fake_post(url, json=None, timeout=None):
+            n = len(json["locations"].split("|"))
+            sizes.append(n)
+            if n > elevation.OPENTOPO_MAX_LOCATIONS:
+                return fake_response({"error": "too many locations"}, status_code=400)
+            return fake_response({"results": [{"elevation": 1.0}] * n})
+
+        monkeypatch.setattr(elevation.http, "post", fake_post)
+        coords = [(40.7 + i * 1e-4, -74.0) for i in range(250)]
+        assert elevation.fetch_opentopo(coords).tolist() == [1.0] * 250
+        assert sizes == [100, 100, 50]
+        assert self.sleeps == [elevation.OPENTOPO_CHUNK_INTERVAL_S] * 2   # sequential, rate-limited
+
+    def test_chunked_fetch_stops_at_first_failure(self, monkeypatch, fake_response):
+        calls = []
+
+        def fake_post(url, json=None, timeout=None):
+            calls.append(json)
+            return fake_response({"error": "rate limited"}, status_code=429)
+
+        monkeypatch.setattr(elevation.http, "post", fake_post)
+        assert elevation.fetch_opentopo([(40.7 + i * 1e-4, -74.0) for i in range(250)]) is None
+        assert len(calls) == 1
+
+    def test_network_error_returns_none(self, monkeypatch):
+        def boom(url, json=None, timeout=None):
+            raise ConnectionError("down")
+        monkeypatch.setattr(elevation.http, "post", boom)
+        assert elevation.fetch_opentopo([(40.7, -74.0)]) is None
+
+
+# ===========================================================================
+# Batch fetch
+# ===========================================================================
+
+class TestFetchBatch:
+
+    @pytest.fixture(autouse=True)
+    def hot_only(self, monkeypatch):
+        monkeypatch.setattr(elevation, "ELEVATION_CACHE_PATH", "")
+        monkeypatch.setattr(elevation, "ELEV_CACHE", elevation._ElevationStore())
+
+    def _seed(self, coord, z):
+        elevation.ELEV_CACHE.put_many(elevation.cache_keys([coord]), [z])
+
+    def test_only_misses_go_upstream(self, monkeypatch):
+        coords = [(40.7, -74.0), (40.701, -74.0), (40.702, -74.0)]
+        self._seed(coords[1], 5.0)
+        requested = []
+
+        def fake_opentopo(c):
+            requested.append(list(c))
+            return [1.0, 3.0]
+
+        monkeypatch.setattr(elevation, "fetch_opentopo", fake_opentopo)
+        assert elevation.fetch_batch(coords).tolist() == [1.0, 5.0, 3.0]
+        assert requested == [[coords[0], coords[2]]]
+
+    def test_duplicate_points_fetched_once(self, monkeypatch):
+        coords = [(40.7, -74.0), (40.700001, -74.0), (40.701, -74.0), (40.7, -74.0)]
+        requested = []
+
+        def fake_opentopo(c):
+            requested.append(list(c))
+            return [1.0, 2.0]
+
+        monkeypatch.setattr(elevation, "fetch_opentopo", fake_opentopo)
+        assert elevation.fetch_batch(coords).tolist() == [1.0, 1.0, 2.0, 1.0]
+        assert requested == [[(40.7, -74.0), (40.701, -74.0)]]
+
+    def test_all_providers_fail_fills_zeros_without_caching(self, monkeypatch):
+        calls = []
+        for name in ("fetch_opentopo", "fetch_esri", "fetch_usgs"):
+            monkeypatch.setattr(elevation, name, lambda c: calls.append(c))
+        monkeypatch.setattr(elevation, "_neg_cache", elevation.TTLCache(ttl_seconds=60))
+        self._seed((40.7, -74.0), 7.0)
+        coords = [(40.7, -74.0), (40.8, -74.0)]
+
+        assert elevation.fetch_batch(coords).tolist() == [7.0, 0.0]
+        assert len(calls) == 3
+        assert not elevation.ELEV_CACHE.get_many(elevation.cache_keys(coords[1:]))[1].any()
+
+        # Negative-cached: an immediate retry does not hit upstream again
+        assert elevation.fetch_batch(coords).tolist() == [7.0, 0.0]
+        assert len(calls) == 3
+
+    def test_all_null_result_falls_through_to_next_provider(self, monkeypatch):
+        monkeypatch.setattr(elevation, "fetch_opentopo", lambda c: [None, None])
+        monkeypatch.setattr(elevation, "fetch_esri", lambda c: [8.0, 9.0])
+        assert elevation.fetch_batch([(40.7, -74.0), (40.8, -74.0)]).tolist() == [8.0, 9.0]
+
+    def test_unresolved_points_are_not_cached(self, monkeypatch):
+        monkeypatch.setattr(elevation, "fetch_opentopo", lambda c: [4.0, None])
+        coords = [(40.7, -74.0), (40.8, -74.0)]
+        assert elevation.fetch_batch(coords).tolist() == [4.0, 0.0]
+        assert elevation.ELEV_CACHE.get_many(elevation.cache_keys(coords))[1].tolist() == [True, False]
+
+
+# ===========================================================================
+# Flat-route stats (routing_elevation)
+# ===========================================================================
+
+class TestElevationRouteStats:
+
+    def test_max_slope_is_percent_grade_not_rise(self):
+        coords = [(40.7, -74.0), (40.701, -74.0), (40.702, -74.0)]   # ~111 m runs
+        stats = routing_elevation._elevation_stats(coords, [0.0, 5.56, 5.56])
+        assert stats["max_slope_percent"] == pytest.approx(5.0, abs=0.05)
+        assert stats["elevation_gain_m"] == 5.6
+        assert stats["difficulty"] == "Moderate"
+
+    def test_duplicate_points_do_not_blow_up_grade(self):
+        stats = routing_elevation._elevation_stats([(40.7, -74.0), (40.7, -74.0)], [0.0, 3.0])
+        assert stats["max_slope_percent"] == 0.0
+
+
+class TestFetchValhallaHeights:
+
+    @pytest.fixture(autouse=True)
+    def _fake(self, fake_response):
+        self.fake_response = fake_response
+
+    def _serve(self, monkeypatch, payload):
+        sent = []
+        monkeypatch.setattr(routing_elevation.http, "post",
+                            lambda url, json=None, timeout=None: sent.append(json) or self.fake_response(payload))
+        return routing_elevation._fetch_valhalla_heights, sent
+
+    def test_sends_encoded_shape_and_reads_height_list(self, monkeypatch):
+        fetch, sent = self._serve(monkeypatch, {"encoded_polyline": "abc", "height": [12, 14.5]})
+        assert fetch("abc", 2) == [12, 14.5]
+        assert sent == [{"encoded_polyline": "abc", "shape_format": "polyline6"}]
+
+    def test_missing_or_partial_heights_fall_back(self, monkeypatch):
+        fetch, _ = self._serve(monkeypatch, {"height": [12, None]})
+        assert fetch("abc", 2) is None
+        assert fetch("abc", 3) is None
@@ -0,0 +1,27 @@
+# tests/test_export_gpx.py
+#
+# Unit tests for streamed GPX export.
+
+from backend.gpx import export_gpx
+from backend.gpx.export_gpx import iter_gpx
+from backend.gpx.import_gpx import parse_gpx
+
+
+class TestIterGpx:
+
+    def test_round_trips_through_import(self):
+        coords = [(40.7128, -74.006), (40.7131234567, -74.0055)]
+        doc = "".join(iter_gpx(coords)).encode()
+        assert parse_gpx(doc).tolist() == [[40.7128, -74.006], [40.713123, -74.0055]]
+
+    def test_name_is_escaped(self):
+        doc = "".join(iter_gpx([(1.0, 2.0)], name='Tom & Jerry <loop>'))
+        assert "<name>Tom &amp; Jerry &lt;loop&gt;</name>" in doc
+
+    def test_chunks_long_routes(self, monkeypatch):
+        monkeypatch.setattr(export_gpx, "CHUNK_POINTS", 10)
+        chunks = list(iter_gpx([(0.0, 0.0)] * 25))
+        assert len(chunks) == 5   # header, 10, 10, 5, footer
+
+    def test_empty_route_is_valid_gpx(self):
+        assert parse_gpx("".join(iter_gpx([])).encode()).shape == (0, 2)
@@ -0,0 +1,35 @@
+# tests/test_http.py
+#
+# Unit tests for the shared HTTP helpers.
+#
+# No network access — the shared session's get() is monkeypatched.
+
+import pytest
+import requests
+
+from backend.utils import http
+
+
+class TestGetJson:
+
+    def _serve(self, monkeypatch, resp):
+        monkeypatch.setattr(http.session, "get", lambda url, **kw: resp)
+
+    def test_decodes_json_body(self, monkeypatch, fake_response):
+        self._serve(monkeypatch, fake_response(content=b'{"features": [1, 2]}'))
+        assert http.get_json("https://example.test") == {"features": [1, 2]}
+
+    @pytest.mark.parametrize("resp", [
+        dict(status_code=503, content=b'{"error": "down"}'),
+        dict(content=b"<html>quota exceeded</html>", content_type="text/html; charset=UTF-8"),
+        dict(content=b""),
+    ])
+    def test_error_bodies_return_none(self, monkeypatch, fake_response, resp):
+        self._serve(monkeypatch, fake_response(**resp))
+        assert http.get_json("https://example.test") is None
+
+    def test_network_error_returns_none(self, monkeypatch):
+        def boom(url, **kw):
+            raise requests.Timeout("slow upstream")
+        monkeypatch.setattr(http.session, "get", boom)
+        assert http.get_json("https://example.test") is None
@@ -0,0 +1,44 @@
+# tests/test_import_gpx.py
+#
+# Unit tests for GPX import parsing.
+
+import xml.etree.ElementTree as ET
+
+import pytest
+
+from backend.gpx.import_gpx import parse_gpx
+
+
+def _gpx(body: str) -> bytes:
+    return (
+        '<?xml version="1.0" encoding="UTF-8"?>'
+        '<gpx version="1.1" creator="test" xmlns="http://www.topografix.com/GPX/1/1">'
+        f"{body}</gpx>"
+    ).encode()
+
+
+class TestParseGpx:
+
+    def test_track_points_in_order(self):
+        data = _gpx(
+            '<wpt lat="1.0" lon="1.0"/>'
+            '<trk><name>t</name><trkseg>'
+            '<trkpt lat="40.7" lon="-74.0"><ele>10</ele></trkpt>'
+            '<trkpt lat="40.71" lon="-74.01"/>'
+            '</trkseg><trkseg><trkpt lat="40.72" lon="-74.02"/></trkseg></trk>'
+        )
+        assert parse_gpx(data).tolist() == [[40.7, -74.0], [40.71, -74.01], [40.72, -74.02]]
+
+    def test_falls_back_to_route_points(self):
+        data = _gpx('<wpt lat="1.0" lon="1.0"/><rte><rtept lat="2.0" lon="3.0"/></rte>')
+        assert parse_gpx(data).tolist() == [[2.0, 3.0]]
+
+    def test_falls_back_to_waypoints(self):
+        assert parse_gpx(_gpx('<wpt lat="1.5" lon="-2.5"/>')).tolist() == [[1.5, -2.5]]
+
+    def test_empty_file(self):
+        assert parse_gpx(_gpx("")).shape == (0, 2)
+
+    def test_malformed_xml_raises(self):
+        with pytest.raises(ET.ParseError):
+            parse_gpx(b"<gpx><trk>")
@@ -0,0 +1,85 @@
+# tests/test_routing_ai.py
+#
+# Unit tests for the AI router's pure helpers: route scoring, costing lists
+# and loop assembly.
+#
+# No Valhalla or weather calls are made.
+
+import polyline
+import pytest
+
+from backend import routing_ai
+from backend.routing_ai import _assemble_loop, _build_costing_list, _make_scorer
+
+
+# ===========================================================================
+# Scoring
+# ===========================================================================
+
+class TestMakeScorer:
+
+    @pytest.mark.parametrize("label,weather,night,km,expected", [
+        ("scenic",     "clear", False, 2.0,  3 - 0.2),
+        ("scenic",     "rain",  False, 2.0,  3 - 1 - 0.2),
+        ("safe_night", "clear", True,  5.0,  4 + 2 - 0.5),
+        ("safe_day",   "hot",   True,  1.0,  2 - 1 + 2 - 0.1),
+        ("explore",    "clear", True,  0.0,  2),
+        ("snow_route", "snow",  False, 3.0,  3 - 1 - 0.3),
+        ("unknown",    "clear", True,  1.0,  1 - 0.1),
+        ("unknown",    "snow",  False, 1.0,  1 - 1 - 0.1),
+    ])
+    def test_pins_formula(self, label, weather, night, km, expected):
+        assert _make_scorer(weather, night)(label, km) == pytest.approx(expected)
+
+    def test_night_bonus_only_for_safe_labels(self):
+        score = _make_scorer("clear", True)
+        bonus = {label for label in routing_ai._LABEL_SCORE
+                 if score(label, 0.0) - routing_ai._LABEL_SCORE[label] == 2}
+        assert bonus == {"safe_day", "safe_night"}
+
+
+# ===========================================================================
+# Costing lists
+# ===========================================================================
+
+class TestBuildCostingList:
+
+    def test_clear_weather_uses_presets(self):
+        assert _build_costing_list("clear") is routing_ai.COSTING_PRESETS
+
+    def test_bad_weather_adds_its_extra_route(self):
+        labels = [label for label, _ in _build_costing_list("rain")]
+        assert labels[:-1] == [label for label, _ in routing_ai.COSTING_PRESETS]
+        assert labels[-1] == "rain_route"
+
+
+# ===========================================================================
+# Loop assembly
+# ===========================================================================
+
+def _leg(a, b, length_km, n=20):
+    pts = [(a[0] + (b[0] - a[0]) * k / n, a[1] + (b[1] - a[1]) * k / n) for k in range(n + 1)]
+    return {"shape": polyline.encode(pts, precision=6), "summary": {"length": length_km}}
+
+
+class TestAssembleLoop:
+
+    CENTER, MID1, MID2 = (40.7, -74.0), (40.705, -74.0), (40.705, -73.995)
+
+    def test_loop_km_is_sum_of_routed_leg_lengths(self):
+        legs = [_leg(self.CENTER, self.MID1, 0.61), _leg(self.MID1, self.MID2, 0.48),
+                _leg(self.MID2, self.CENTER, 0.77)]
+        loop = _assemble_loop(legs, "scenic")
+        assert loop["loop_km"] == pytest.approx(1.86)
+        assert loop["coordinates"][0] == self.CENTER
+        assert len(loop["coordinates"]) == len(set(loop["coordinates"]))
+
+    def test_rejects_unsafe_leg(self):
+        bad = dict(_leg(self.MID1, self.MID2, 0.5), edges=[{"road_class": "motorway"}])
+        legs = [_leg(self.CENTER, self.MID1, 0.6), bad, _leg(self.MID2, self.CENTER, 0.8)]
+        assert _assemble_loop(legs, "scenic") is None
+
+    def test_rejects_teleporting_leg(self):
+        jump = {"shape": polyline.encode([self.CENTER, (40.8, -74.0)], precision=6),
+                "summary": {"length": 11.0}}
+        assert _assemble_loop([jump, _leg((40.8, -74.0), self.CENTER, 11.0)], "scenic") is None
@@ -0,0 +1,82 @@
+# tests/test_valhalla_client.py
+#
+# Unit tests for the Valhalla client: response cache and multi-stop routing.
+#
+# No Valhalla instance needed — the shared HTTP session's post() is monkeypatched.
+
+import pytest
+
+from backend import valhalla_client
+from backend.cache import TTLCache
+
+
+class TestValhallaRouteCache:
+
+    @pytest.fixture(autouse=True)
+    def fresh_cache(self, monkeypatch, fake_response):
+        monkeypatch.setattr(valhalla_client, "valhalla_cache", TTLCache(ttl_seconds=120))
+        self.fake_response = fake_response
+        self.calls = []
+
+    def _serve(self, monkeypatch, payload):
+        def fake_post(url, json=None, timeout=None):
+            self.calls.append(json)
+            return self.fake_response(payload)
+        monkeypatch.setattr(valhalla_client.http, "post", fake_post)
+
+    def test_identical_request_served_from_cache(self, monkeypatch):
+        self._serve(monkeypatch, {"trip": {"legs": []}})
+        opts = {"pedestrian": {"use_hills": 0.5}}
+        first = valhalla_client.valhalla_route((40.71231, -74.0061), (40.72, -74.0), "pedestrian", opts)
+        again = valhalla_client.valhalla_route((40.71234, -74.0061), (40.72, -74.0), "pedestrian", opts)
+        assert first == again == {"trip": {"legs": []}}
+        assert len(self.calls) == 1
+
+    def test_cache_hits_are_independent_copies(self, monkeypatch):
+        self._serve(monkeypatch, {"trip": {"legs": [{"shape": "abc"}]}})
+        first = valhalla_client.valhalla_route((40.7, -74.0), (40.72, -74.0))
+        first["trip"]["legs"][0]["shape"] = "mutated"
+        second = valhalla_client.valhalla_route((40.7, -74.0), (40.72, -74.0))
+        second["trip"]["legs"].append({})
+        third = valhalla_client.valhalla_route((40.7, -74.0), (40.72, -74.0))
+        assert third == {"trip": {"legs": [{"shape": "abc"}]}}
+        assert len(self.calls) == 1
+
+    def test_costing_options_are_part_of_the_key(self, monkeypatch):
+        self._serve(monkeypatch, {"trip": {"legs": []}})
+        valhalla_client.valhalla_route((40.7, -74.0), (40.72, -74.0), "pedestrian", {"pedestrian": {"use_lit": 0.5}})
+        valhalla_client.valhalla_route((40.7, -74.0), (40.72, -74.0), "pedestrian", {"pedestrian": {"use_lit": 1.5}})
+        assert len(self.calls) == 2
+
+    def test_errors_are_not_cached(self, monkeypatch):
+        self._serve(monkeypatch, {"error": "No path could be found"})
+        for _ in range(2):
+            assert "trip" not in valhalla_client.valhalla_route((40.7, -74.0), (40.72, -74.0))
+        assert len(self.calls) == 2
+
+    def test_via_points_become_locations_and_key(self, monkeypatch):
+        self._serve(monkeypatch, {"trip": {"legs": [{}, {}, {}]}})
+        center, via = (40.7, -74.0), [(40.71, -74.0), (40.71, -73.99)]
+        valhalla_client.valhalla_route(center, center, via=via)
+        assert self.calls[0]["locations"] == [
+            {"lat": 40.7, "lon": -74.0}, {"lat": 40.71, "lon": -74.0},
+            {"lat": 40.71, "lon": -73.99}, {"lat": 40.7, "lon": -74.0},
+        ]
+        valhalla_client.valhalla_route(center, center, via=via)
+        valhalla_client.valhalla_route(center, center, via=via[:1])
+        assert len(self.calls) == 2
+
+
+class TestValhallaRouteMany:
+
+    def test_optional_via_passed_through_in_job_order(self, monkeypatch):
+        def fake_route(start, end, costing, options, via=None):
+            return {"via": via}
+        monkeypatch.setattr(valhalla_client, "valhalla_route", fake_route)
+        jobs = [
+            ("a", (0, 0), (1, 1), "pedestrian", None),
+            ("b", (0, 0), (0, 0), "pedestrian", None, [(0.5, 0.5)]),
+        ]
+        assert valhalla_client.valhalla_route_many(jobs) == [
+            ("a", {"via": None}), ("b", {"via": [(0.5, 0.5)]}),
+        ]